@@ -115,7 +115,7 @@ class Alpha(discord.AutoShardedClient):
 				return
 			properties = await self.guild_secure_fetch(guild.id)
 			properties = MessageRequest.create_guild_settings(properties)
-			await database.document("discord/properties/guilds/{}".format(guild.id)).set(properties)
+			await database.document("discord/properties/guilds/{}".format(guild.id)).set(properties, merge=True)
 			await self.update_guild_count()
 		except Exception:
 			print(format_exc())
@@ -391,15 +391,15 @@ class Alpha(discord.AutoShardedClient):
 			# Ignore if user if locked in a prompt, or banned
 			if _authorId in self.lockedUsers or _authorId in constants.blockedUsers or _guildId in constants.blockedGuilds: return
 
-			_accountProperties = {}
-			_guildProperties = await self.guildProperties.get(_guildId, {})
+			if message.author.bot:
+				_guildProperties, _accountProperties = await self.guildProperties.get(_guildId), {}
+			else:
+				_guildProperties, _accountId, _accountProperties = await self.accountProperties.fetch_context(_authorId, _guildId, message.webhook_id is not None)
 			_checkpoint2 = time() * 1000
-			if not message.author.bot:
-				if message.webhook_id is None: _accountId = await self.accountProperties.match(_authorId)
-				if _accountId is None:
-					_accountProperties = await self.accountProperties.get(str(_authorId), {})
-				else:
-					_accountProperties = await self.accountProperties.get(_accountId, {})
+			# Only records the database service returned are normalized, missing ones get the default settings
+			_isNormalized = bool(_guildProperties)
+			if _guildProperties is None: _guildProperties = {}
+			if _accountProperties is None: _accountProperties = {}
 			_checkpoint3 = time() * 1000
 
 			messageRequest = MessageRequest(
@@ -410,7 +410,8 @@ class Alpha(discord.AutoShardedClient):
 				channelId=_channelId,
 				guildId=_guildId,
 				accountProperties=_accountProperties,
-				guildProperties=_guildProperties
+				guildProperties=_guildProperties,
+				isNormalized=_isNormalized
 			)
 			_snapshot = "{}-{:02d}".format(message.created_at.year, message.created_at.month)
 			sentMessages = []
@@ -994,7 +995,7 @@ class Alpha(discord.AutoShardedClient):
 
 						elif footerText.startswith("Id: ") and titleText.startswith("Paper"):
 							accountId = await self.accountProperties.match(user.id)
-							properties = await self.accountProperties.get(accountId)
+							properties = await self.accountProperties.get(accountId, cached=False)
 
 							matchedId, orderId = footerText.lstrip("Id: ").split("/")
 							if accountId in [accountId, str(user.id)]:
@@ -1039,7 +1040,7 @@ class Alpha(discord.AutoShardedClient):
 
 						elif " → `" in titleText and titleText.endswith("`"):
 							accountId = await self.accountProperties.match(user.id, user.id)
-							properties = await self.accountProperties.get(accountId)
+							properties = await self.accountProperties.get(accountId, cached=False)
 
 							properties, (titleMessage, _, _) = Presets.update_presets(properties, remove=titleText.split("`")[1])
 							if titleMessage == "Preset removed":
@@ -1127,7 +1128,8 @@ class Alpha(discord.AutoShardedClient):
 								sentMessages.append(await message.channel.send(embed=embed))
 								return (sentMessages, len(sentMessages))
 
-							properties, statusParts = Presets.update_presets(messageRequest.accountProperties, add=title, shortcut=shortcut, messageRequest=messageRequest)
+							accountProperties = await self.accountProperties.get(messageRequest.authorId if messageRequest.accountId is None else messageRequest.accountId, messageRequest.accountProperties, cached=False)
+							properties, statusParts = Presets.update_presets(accountProperties, add=title, shortcut=shortcut, messageRequest=messageRequest)
 							statusTitle, statusMessage, statusColor = statusParts
 
 							if not messageRequest.is_registered():
@@ -2542,7 +2544,8 @@ class Alpha(discord.AutoShardedClient):
 						ticker = currentRequest.get("ticker")
 						exchange = ticker.get("exchange")
 
-						outputTitle, outputMessage, paper, pendingOrder = await self.paperTrader.process_trade(messageRequest.accountProperties["paperTrader"], orderType, currentPlatform, currentRequest, payload)
+						accountProperties = await self.accountProperties.get(messageRequest.accountId, messageRequest.accountProperties, cached=False)
+						outputTitle, outputMessage, paper, pendingOrder = await self.paperTrader.process_trade(accountProperties["paperTrader"], orderType, currentPlatform, currentRequest, payload)
 
 						if pendingOrder is None:
 							embed = discord.Embed(title=outputMessage, color=constants.colors["gray"])
@@ -2662,8 +2665,9 @@ class Alpha(discord.AutoShardedClient):
 						await delete_collection(database.collection("details/openPaperOrders/{}".format(messageRequest.accountId)), 300)
 						await delete_collection(database.collection("details/paperOrderHistory/{}".format(messageRequest.accountId)), 300)
 
+					accountProperties = await self.accountProperties.get(messageRequest.accountId, messageRequest.accountProperties, cached=False)
 					paper = {
-						"globalResetCount": messageRequest.accountProperties["paperTrader"]["globalResetCount"] + 1,
+						"globalResetCount": accountProperties["paperTrader"]["globalResetCount"] + 1,
 						"globalLastReset": int(time()),
 						"balance": DELETE_FIELD
 					}
@@ -1,19 +1,35 @@
 from os import environ
 from time import time
+from asyncio import get_running_loop
+from socket import SOCK_STREAM
+from collections import OrderedDict
 from zmq.asyncio import Context, Poller
-from zmq import REQ, LINGER, POLLIN
-from orjson import loads
+from zmq import REQ, SUB, LINGER, POLLIN, SUBSCRIBE, EVENTS
+from orjson import dumps, loads
 from io import BytesIO
 
 
+CACHE_SIZE = 16384
+CACHE_TTL = 300
+PUBLISHER_LOOKUP_INTERVAL = 30
+
 class DatabaseConnector(object):
 	zmqContext = Context.instance()
 
+	cache = OrderedDict()
+	changeSubscriber = None
+	changePublishers = set()
+	changeSequences = {}
+	publisherLookupTime = 0
+	changeCount = 0
+
+	keyMirrors = {}
+
 	def __init__(self, mode):
 		self.mode = mode
 
 	@staticmethod
-	async def execute_database_request(endpoint, parameters, timeout=1):
+	async def execute_database_request(endpoint, *parameters, timeout=1, raw=False):
 		socket = DatabaseConnector.zmqContext.socket(REQ)
 		payload, responseText = None, None
 		socket.connect("tcp://database:6900")
@@ -21,31 +37,140 @@ class DatabaseConnector(object):
 		poller = Poller()
 		poller.register(socket, POLLIN)
 
-		await socket.send_multipart([endpoint, bytes(str(int((time() + timeout) * 1000)), encoding='utf8'), parameters])
+		await socket.send_multipart([endpoint, bytes(str(int((time() + timeout) * 1000)), encoding='utf8'), *parameters])
 		responses = await poller.poll(timeout * 1000)
 
 		if len(responses) != 0:
 			[response] = await socket.recv_multipart()
 			socket.close()
-			return loads(response)
+			return response if raw else loads(response)
 		else:
 			socket.close()
 		return None
 
+	@staticmethod
+	async def apply_changes():
+		# The database publishes every change to account and guild properties, cached responses are patched in place
+		if DatabaseConnector.changeSubscriber is None:
+			DatabaseConnector.changeSubscriber = DatabaseConnector.zmqContext.socket(SUB)
+			DatabaseConnector.changeSubscriber.setsockopt(LINGER, 0)
+			DatabaseConnector.changeSubscriber.setsockopt(SUBSCRIBE, b"")
+		if DatabaseConnector.publisherLookupTime <= time(): await DatabaseConnector.connect_publishers()
+		while DatabaseConnector.changeSubscriber.getsockopt(EVENTS) & POLLIN:
+			[mode, sequence, *changes] = await DatabaseConnector.changeSubscriber.recv_multipart()
+			publisherId, publishedCount = sequence.split(b":")
+			if DatabaseConnector.changeSequences.get(publisherId) != int(publishedCount) - 1:
+				# Changes published before subscribing, dropped in transit or lost to a restart of the replica are unknown
+				DatabaseConnector.flush_cache()
+			DatabaseConnector.changeSequences[publisherId] = int(publishedCount)
+			for i in range(0, len(changes), 3):
+				key = (mode, changes[i], changes[i + 1])
+				DatabaseConnector.changeCount += 1
+				if key in DatabaseConnector.cache:
+					DatabaseConnector.cache[key] = (time() + CACHE_TTL, changes[i + 2])
+
+	@staticmethod
+	async def connect_publishers():
+		# Every database replica publishes the changes it has seen, following all of them means a response cached from a lagging
+		# replica is patched as soon as that replica catches up. The headless service resolves to the addresses of all replicas.
+		DatabaseConnector.publisherLookupTime = time() + PUBLISHER_LOOKUP_INTERVAL
+		try: addresses = {"tcp://{}:6901".format(address[4][0]) for address in await get_running_loop().getaddrinfo("database-changes", 6901, type=SOCK_STREAM)}
+		except: return
+		for address in addresses - DatabaseConnector.changePublishers:
+			DatabaseConnector.changeSubscriber.connect(address)
+		for address in DatabaseConnector.changePublishers - addresses:
+			DatabaseConnector.changeSubscriber.disconnect(address)
+		DatabaseConnector.changePublishers = addresses
+
+	@staticmethod
+	def flush_cache():
+		DatabaseConnector.cache.clear()
+		DatabaseConnector.changeCount += 1
+
+	@staticmethod
+	def get_cached_response(key):
+		if key not in DatabaseConnector.cache: return None
+		expiry, response = DatabaseConnector.cache[key]
+		if expiry <= time():
+			del DatabaseConnector.cache[key]
+			return None
+		DatabaseConnector.cache.move_to_end(key)
+		return response
+
+	@staticmethod
+	def cache_response(key, response):
+		DatabaseConnector.cache[key] = (time() + CACHE_TTL, response)
+		DatabaseConnector.cache.move_to_end(key)
+		if len(DatabaseConnector.cache) > CACHE_SIZE: DatabaseConnector.cache.popitem(last=False)
+
+	async def execute_cached_request(self, kind, value, cached=True):
+		key = (self.mode.encode(), kind, bytes(str(value), encoding='utf8'))
+		await DatabaseConnector.apply_changes()
+		response = DatabaseConnector.get_cached_response(key) if cached else None
+		if response is not None: return loads(response)
+		changeCount = DatabaseConnector.changeCount
+
+		response = await DatabaseConnector.execute_database_request(key[0] + b"_" + kind, key[2], raw=True)
+		if response is None: return None
+
+		# A response that raced with a published change might already be outdated and is not kept
+		await DatabaseConnector.apply_changes()
+		if changeCount == DatabaseConnector.changeCount: DatabaseConnector.cache_response(key, response)
+		return loads(response)
+
+	async def execute_context_request(self, authorId, guildId, isWebhook):
+		authorId, guildId = bytes(str(authorId), encoding='utf8'), bytes(str(guildId), encoding='utf8')
+		guildKey, matchKey = (b"guild", b"fetch", guildId), (b"account", b"match", authorId)
+		await DatabaseConnector.apply_changes()
+		# Everything a message needs is usually cached already, otherwise it's all resolved in a single round trip
+		guildProperties = DatabaseConnector.get_cached_response(guildKey)
+		accountId = b"null" if isWebhook else DatabaseConnector.get_cached_response(matchKey)
+		accountProperties = None
+		if accountId is not None:
+			accountKey = authorId if accountId == b"null" else loads(accountId).encode()
+			accountProperties = DatabaseConnector.get_cached_response((b"account", b"fetch", accountKey))
+		if guildProperties is not None and accountProperties is not None:
+			return loads(guildProperties), loads(accountId), loads(accountProperties)
+		changeCount = DatabaseConnector.changeCount
+
+		response = await DatabaseConnector.execute_database_request(b"context_fetch", authorId, guildId, b"1" if isWebhook else b"0")
+		if response is None: return None
+
+		await DatabaseConnector.apply_changes()
+		if changeCount == DatabaseConnector.changeCount:
+			DatabaseConnector.cache_response(guildKey, dumps(response["guildProperties"]))
+			if not isWebhook: DatabaseConnector.cache_response(matchKey, dumps(response["accountId"]))
+			accountKey = authorId if response["accountId"] is None else response["accountId"].encode()
+			DatabaseConnector.cache_response((b"account", b"fetch", accountKey), dumps(response["accountProperties"]))
+		return response["guildProperties"], response["accountId"], response["accountProperties"]
+
+	async def execute_keys_request(self):
+		# Only keys that changed since the last known version are transferred and patched into the local mirror
+		version, keys = DatabaseConnector.keyMirrors.get(self.mode, (0, {}))
+		response = await DatabaseConnector.execute_database_request(bytes(self.mode + "_keys_since", encoding='utf8'), bytes(repr(version), encoding='utf8'), timeout=5.0)
+		if response is None: return None
+
+		if response["full"]: version, keys = response["version"], {}
+		keys.update(response["changed"])
+		for key in response["removed"]: keys.pop(key, None)
+		DatabaseConnector.keyMirrors[self.mode] = (max(version, response["version"]), keys)
+		return dict(keys)
+
 	async def check_status(self):
 		try: return await DatabaseConnector.execute_database_request(bytes(self.mode + "_status", encoding='utf8'), b"")
 		except: return False
 
 	async def keys(self, default={}):
-		try: response = await DatabaseConnector.execute_database_request(bytes(self.mode + "_keys", encoding='utf8'), b"", timeout=5.0)
+		try: response = await self.execute_keys_request()
 		except: return default
 
 		if response is None:
 			return default
 		return response
 
-	async def get(self, value, default=None):
-		try: response = await DatabaseConnector.execute_database_request(bytes(self.mode + "_fetch", encoding='utf8'), bytes(str(value), encoding='utf8'))
+	async def get(self, value, default=None, cached=True):
+		# Callers that modify and write back what they read should skip the cache
+		try: response = await self.execute_cached_request(b"fetch", value, cached)
 		except: return default
 
 		if response is None:
@@ -53,9 +178,17 @@ class DatabaseConnector(object):
 		return response
 
 	async def match(self, value, default=None):
-		try: response = await DatabaseConnector.execute_database_request(bytes(self.mode + "_match", encoding='utf8'), bytes(str(value), encoding='utf8'))
+		try: response = await self.execute_cached_request(b"match", value)
 		except: return default
 
 		if response is None:
 			return default
+		return response
+
+	async def fetch_context(self, authorId, guildId, isWebhook):
+		try: response = await self.execute_context_request(authorId, guildId, isWebhook)
+		except: return None, None, None
+
+		if response is None:
+			return None, None, None
 		return response
\ No newline at end of file
@@ -1,5 +1,5 @@
 class MessageRequest(object):
-	def __init__(self, raw=None, content=None, accountId=None, authorId=None, channelId=None, guildId=None, presetUsed=False, accountProperties={}, guildProperties={}):
+	def __init__(self, raw=None, content=None, accountId=None, authorId=None, channelId=None, guildId=None, presetUsed=False, accountProperties={}, guildProperties={}, isNormalized=False):
 		self.raw = raw
 		self.content = content
 
@@ -9,7 +9,8 @@ class MessageRequest(object):
 		self.guildId = guildId
 
 		self.accountProperties = accountProperties
-		self.guildProperties = MessageRequest.create_guild_settings(guildProperties)
+		# Guild properties served by the database are already normalized
+		self.guildProperties = guildProperties if isNormalized else MessageRequest.create_guild_settings(guildProperties)
 		self.overrides = self.guildProperties.get("overrides", {})
 
 		self.presetUsed = False
@@ -1,64 +1,218 @@
 from os import environ
-from zmq.asyncio import Context, Poller
-from zmq import REQ, LINGER, POLLIN
+from asyncio import get_running_loop, ensure_future, shield, wait_for, TimeoutError
+from itertools import count
+from collections import OrderedDict
+from zmq.asyncio import Context
+from zmq import DEALER, LINGER
 from orjson import loads
+from time import time
+from ccxt.base import decimal_to_precision as dtp
 from io import BytesIO
 
 
+PRECISION_TABLE_TTL = 3600
+CONNECTION_POOL_SIZE = 4
+CACHE_SIZE = 4096
+CACHE_TTL = 600
+
+class ParserConnection(object):
+	def __init__(self, context):
+		self.socket = context.socket(DEALER)
+		self.socket.setsockopt(LINGER, 0)
+		self.socket.connect("tcp://parser:6900")
+		self.pendingRequests = {}
+		self.receiver = get_running_loop().create_task(self.receive())
+
+	async def receive(self):
+		while True:
+			message = await self.socket.recv_multipart()
+			# Replies to requests that already timed out are no longer pending and get dropped
+			response = self.pendingRequests.pop(message[0], None)
+			if response is not None and not response.done(): response.set_result((int(message[2]), message[3:]))
+
+	def close(self):
+		self.receiver.cancel()
+		self.socket.close()
+
 class TickerParser(object):
 	zmqContext = Context.instance()
+	connections = [None] * CONNECTION_POOL_SIZE
+	requestIds = count(1)
+	precisionTables = {}
+
+	cache = OrderedDict()
+	inflightRequests = {}
+	generation = None
+
+	@staticmethod
+	def get_connection(slot):
+		connection = TickerParser.connections[slot]
+		if connection is None or connection.receiver.done():
+			if connection is not None: connection.close()
+			connection = ParserConnection(TickerParser.zmqContext)
+			TickerParser.connections[slot] = connection
+		return connection
+
+	@staticmethod
+	async def send_parser_request(endpoint, parameters, timeout=5):
+		requestId = next(TickerParser.requestIds)
+		connection = TickerParser.get_connection(requestId % CONNECTION_POOL_SIZE)
+		requestId = str(requestId).encode()
+		response = get_running_loop().create_future()
+		connection.pendingRequests[requestId] = response
+
+		try:
+			await connection.socket.send_multipart([requestId, b"", endpoint] + parameters)
+			return await wait_for(response, timeout)
+		except TimeoutError:
+			raise Exception("time out")
+		finally:
+			connection.pendingRequests.pop(requestId, None)
 
 	@staticmethod
 	async def execute_parser_request(endpoint, parameters, timeout=5):
-		socket = TickerParser.zmqContext.socket(REQ)
-		socket.connect("tcp://parser:6900")
-		socket.setsockopt(LINGER, 0)
-		poller = Poller()
-		poller.register(socket, POLLIN)
-
-		await socket.send_multipart([endpoint] + parameters)
-		responses = await poller.poll(timeout * 1000)
-
-		if len(responses) != 0:
-			response = await socket.recv_multipart()
-			socket.close()
+		generation, response = await TickerParser.send_parser_request(endpoint, parameters, timeout)
+		TickerParser.check_generation(generation)
+		return response
+
+	@staticmethod
+	def check_generation(generation):
+		# Every reply carries the generation of the index that served it, lookups cached from an older one are dropped
+		if TickerParser.generation is None or generation > TickerParser.generation:
+			TickerParser.generation = generation
+			TickerParser.cache.clear()
+			TickerParser.precisionTables.clear()
+
+	@staticmethod
+	def get_cached_response(key):
+		if key not in TickerParser.cache: return None
+		expiry, response = TickerParser.cache[key]
+		if expiry <= time():
+			del TickerParser.cache[key]
+			return None
+		TickerParser.cache.move_to_end(key)
+		return response
+
+	@staticmethod
+	def cache_response(key, response, generation):
+		if generation != TickerParser.generation or len(response) == 0: return
+		TickerParser.cache[key] = (time() + CACHE_TTL, response)
+		TickerParser.cache.move_to_end(key)
+		if len(TickerParser.cache) > CACHE_SIZE: TickerParser.cache.popitem(last=False)
+
+	@staticmethod
+	async def execute_cached_request(endpoint, parameters):
+		key = (endpoint, *parameters)
+		response = TickerParser.get_cached_response(key)
+		if response is not None: return response
+
+		# Identical requests that are already on their way to the parser are awaited instead of being sent again
+		if key in TickerParser.inflightRequests:
+			generation, response = await shield(TickerParser.inflightRequests[key])
 			return response
-		else:
-			socket.close()
-			raise Exception("time out")
-		return None
+		request = ensure_future(TickerParser.send_parser_request(endpoint, parameters))
+		TickerParser.inflightRequests[key] = request
+		try:
+			generation, response = await shield(request)
+		finally:
+			if TickerParser.inflightRequests.get(key) is request: TickerParser.inflightRequests.pop(key)
+		TickerParser.check_generation(generation)
+		TickerParser.cache_response(key, response, generation)
+		return response
 
 	@staticmethod
 	async def find_exchange(raw, platform, bias):
-		[success, exchange] = await TickerParser.execute_parser_request(b"find_exchange", [raw.encode(), platform.encode(), bias.encode()])
+		[success, exchange] = await TickerParser.execute_cached_request(b"find_exchange", [raw.encode(), platform.encode(), bias.encode()])
 		exchange = None if exchange == b"" else loads(exchange)
 		return bool(int(success)), exchange
 
 	@staticmethod
 	async def match_ticker(tickerId, exchange, platform, bias):
 		exchangeId = exchange.get("id").lower() if bool(exchange) else ""
-		[ticker, error] = await TickerParser.execute_parser_request(b"match_ticker", [tickerId.encode(), exchangeId.encode(), platform.encode(), bias.encode()])
+		[ticker, error] = await TickerParser.execute_cached_request(b"match_ticker", [tickerId.encode(), exchangeId.encode(), platform.encode(), bias.encode()])
 		ticker = None if ticker == b"" else loads(ticker)
 		error = None if error == b"" else error.decode()
 		return ticker, error
 
+	@staticmethod
+	async def match_ticker_batch(queries):
+		responses, missing, parameters = [None] * len(queries), [], []
+		for i, (tickerId, exchange, platform, bias) in enumerate(queries):
+			exchangeId = exchange.get("id").lower() if bool(exchange) else ""
+			query = [tickerId.encode(), exchangeId.encode(), platform.encode(), bias.encode()]
+			responses[i] = TickerParser.get_cached_response((b"match_ticker", *query))
+			if responses[i] is None:
+				missing.append(i)
+				parameters += query
+
+		if len(missing) != 0:
+			generation, response = await TickerParser.send_parser_request(b"match_ticker_batch", parameters)
+			TickerParser.check_generation(generation)
+			for n, i in enumerate(missing):
+				responses[i] = response[n * 2:n * 2 + 2]
+				TickerParser.cache_response((b"match_ticker", *parameters[n * 4:n * 4 + 4]), responses[i], generation)
+
+		results = []
+		for ticker, error in responses:
+			results.append((None if ticker == b"" else loads(ticker), None if error == b"" else error.decode()))
+		return results
+
 	@staticmethod
 	async def check_if_fiat(tickerId):
-		[success, fiat] = await TickerParser.execute_parser_request(b"check_if_fiat", [tickerId.encode()])
+		[success, fiat] = await TickerParser.execute_cached_request(b"check_if_fiat", [tickerId.encode()])
 		fiat = None if fiat == b"" else fiat.decode()
 		return bool(int(success)), fiat
 
 	@staticmethod
 	async def get_listings(tickerBase, tickerQuote):
-		[listings, total] = await TickerParser.execute_parser_request(b"get_listings", [tickerBase.encode(), tickerQuote.encode()])
+		[listings, total] = await TickerParser.execute_cached_request(b"get_listings", [tickerBase.encode(), tickerQuote.encode()])
 		return loads(listings), int(total)
 
+	@staticmethod
+	async def get_precision_table(exchangeId):
+		if exchangeId in TickerParser.precisionTables:
+			expiry, table = TickerParser.precisionTables[exchangeId]
+			if expiry > time(): return table
+		response = await TickerParser.execute_parser_request(b"get_precision_table", [exchangeId.encode()])
+		# A failed lookup is kept as an empty table, markets missing from it are formatted by the parser
+		table = loads(response[0]) if len(response) == 1 else {"precisionMode": None, "markets": {}}
+		TickerParser.precisionTables[exchangeId] = (time() + PRECISION_TABLE_TTL, table)
+		return table
+
+	@staticmethod
+	def format_with_precision_table(table, kind, symbol, value):
+		if symbol not in table["markets"]: return None
+		pricePrecision, amountPrecision = table["markets"][symbol]
+		if kind == "price": return dtp.decimal_to_precision(str(value), rounding_mode=dtp.ROUND, precision=pricePrecision, counting_mode=table["precisionMode"], padding_mode=dtp.PAD_WITH_ZERO)
+		else: return dtp.decimal_to_precision(str(value), rounding_mode=dtp.TRUNCATE, precision=amountPrecision, counting_mode=table["precisionMode"], padding_mode=dtp.NO_PADDING)
+
+	@staticmethod
+	async def get_formatted_ccxt_batch(requests):
+		# Markets with a cached precision table are formatted locally, the rest is formatted by the parser in one request
+		results, missing = [None] * len(requests), []
+		for i, (kind, exchangeId, symbol, value) in enumerate(requests):
+			try: results[i] = TickerParser.format_with_precision_table(await TickerParser.get_precision_table(exchangeId), kind, symbol, value)
+			except: pass
+			if results[i] is None: missing.append(i)
+
+		if len(missing) != 0:
+			parameters = []
+			for i in missing:
+				kind, exchangeId, symbol, value = requests[i]
+				parameters += [kind.encode(), exchangeId.encode(), symbol.encode(), str(value).encode()]
+			response = await TickerParser.execute_parser_request(b"get_formatted_ccxt_batch", parameters)
+			for i, formatted in zip(missing, response):
+				results[i] = None if formatted == b"" else formatted.decode()
+		return results
+
 	@staticmethod
 	async def get_formatted_price_ccxt(exchangeId, symbol, price):
-		[response] = await TickerParser.execute_parser_request(b"get_formatted_price_ccxt", [exchangeId.encode(), symbol.encode(), str(price).encode()])
-		return response.decode()
+		[response] = await TickerParser.get_formatted_ccxt_batch([("price", exchangeId, symbol, price)])
+		if response is None: raise Exception("price could not be formatted")
+		return response
 
 	@staticmethod
 	async def get_formatted_amount_ccxt(exchangeId, symbol, amount):
-		[response] = await TickerParser.execute_parser_request(b"get_formatted_amount_ccxt", [exchangeId.encode(), symbol.encode(), str(amount).encode()])
-		return response.decode()
+		[response] = await TickerParser.get_formatted_ccxt_batch([("amount", exchangeId, symbol, amount)])
+		if response is None: raise Exception("amount could not be formatted")
+		return response
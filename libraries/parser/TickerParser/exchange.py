@@ -47,6 +47,6 @@ class Exchange(object):
 class StocksExchange(object):
 	def __init__(self, id):
 		self.id = id
-		self.symbols = []
+		self.symbols = set()
 		self.markets = {}
 		self.timeframes = ["1m"]
\ No newline at end of file
@@ -1,63 +1,210 @@
 from os import environ
-from zmq import Context, Poller, REQ, LINGER, POLLIN
+from threading import local, Lock
+from itertools import count
+from collections import OrderedDict
+from concurrent.futures import Future
+from zmq import Context, DEALER, LINGER
 from orjson import loads
+from time import time
+from ccxt.base import decimal_to_precision as dtp
 from io import BytesIO
 
 
+PRECISION_TABLE_TTL = 3600
+CACHE_SIZE = 4096
+CACHE_TTL = 600
+
 class TickerParser(object):
 	zmqContext = Context.instance()
+	connections = local()
+	requestIds = count(1)
+	precisionTables = {}
+
+	cache = OrderedDict()
+	cacheLock = Lock()
+	inflightRequests = {}
+	generation = None
+
+	@staticmethod
+	def get_socket():
+		# Sockets can't be shared between threads, so every thread keeps its own connection open
+		if getattr(TickerParser.connections, "socket", None) is None:
+			socket = TickerParser.zmqContext.socket(DEALER)
+			socket.setsockopt(LINGER, 0)
+			socket.connect("tcp://parser:6900")
+			TickerParser.connections.socket = socket
+		return TickerParser.connections.socket
+
+	@staticmethod
+	def send_parser_request(endpoint, parameters, timeout=5):
+		socket = TickerParser.get_socket()
+		requestId = str(next(TickerParser.requestIds)).encode()
+		socket.send_multipart([requestId, b"", endpoint] + parameters)
+
+		deadline = time() + timeout
+		while True:
+			remaining = deadline - time()
+			if remaining <= 0 or socket.poll(int(remaining * 1000)) == 0: raise Exception("time out")
+			message = socket.recv_multipart()
+			# Late replies to requests that already timed out are skipped
+			if message[0] == requestId: return int(message[2]), message[3:]
 
 	@staticmethod
 	def execute_parser_request(endpoint, parameters, timeout=5):
-		socket = TickerParser.zmqContext.socket(REQ)
-		payload, responseText = None, None
-		socket.connect("tcp://parser:6900")
-		socket.setsockopt(LINGER, 0)
-		poller = Poller()
-		poller.register(socket, POLLIN)
-
-		socket.send_multipart([endpoint] + parameters)
-		responses = poller.poll(timeout * 1000)
-
-		if len(responses) != 0:
-			response = socket.recv_multipart()
-			socket.close()
-			return response
-		else:
-			socket.close()
-			raise Exception("time out")
-		return None
+		generation, response = TickerParser.send_parser_request(endpoint, parameters, timeout)
+		with TickerParser.cacheLock:
+			TickerParser.check_generation(generation)
+		return response
+
+	@staticmethod
+	def check_generation(generation):
+		# Every reply carries the generation of the index that served it, lookups cached from an older one are dropped
+		# Must be called with cacheLock held
+		if TickerParser.generation is None or generation > TickerParser.generation:
+			TickerParser.generation = generation
+			TickerParser.cache.clear()
+			TickerParser.precisionTables.clear()
+
+	@staticmethod
+	def get_cached_response(key):
+		if key not in TickerParser.cache: return None
+		expiry, response = TickerParser.cache[key]
+		if expiry <= time():
+			del TickerParser.cache[key]
+			return None
+		TickerParser.cache.move_to_end(key)
+		return response
+
+	@staticmethod
+	def cache_response(key, response, generation):
+		if generation != TickerParser.generation or len(response) == 0: return
+		TickerParser.cache[key] = (time() + CACHE_TTL, response)
+		TickerParser.cache.move_to_end(key)
+		if len(TickerParser.cache) > CACHE_SIZE: TickerParser.cache.popitem(last=False)
+
+	@staticmethod
+	def execute_cached_request(endpoint, parameters):
+		key = (endpoint, *parameters)
+		with TickerParser.cacheLock:
+			response = TickerParser.get_cached_response(key)
+			if response is not None: return response
+
+			# Identical requests that are already on their way to the parser are awaited instead of being sent again
+			request = TickerParser.inflightRequests.get(key)
+			isOwner = request is None
+			if isOwner:
+				request = Future()
+				TickerParser.inflightRequests[key] = request
+
+		if not isOwner: return request.result()
+		try:
+			generation, response = TickerParser.send_parser_request(endpoint, parameters)
+			request.set_result(response)
+		except Exception as e:
+			request.set_exception(e)
+			raise
+		finally:
+			with TickerParser.cacheLock:
+				TickerParser.inflightRequests.pop(key, None)
+		with TickerParser.cacheLock:
+			TickerParser.check_generation(generation)
+			TickerParser.cache_response(key, response, generation)
+		return response
 
 	@staticmethod
 	def find_exchange(raw, platform, bias):
-		[success, exchange] = TickerParser.execute_parser_request(b"find_exchange", [raw.encode(), platform.encode(), bias.encode()])
+		[success, exchange] = TickerParser.execute_cached_request(b"find_exchange", [raw.encode(), platform.encode(), bias.encode()])
 		exchange = None if exchange == b"" else loads(exchange)
 		return bool(int(success)), exchange
 
 	@staticmethod
 	def match_ticker(tickerId, exchange, platform, bias):
 		exchangeId = exchange.get("id").lower() if bool(exchange) else ""
-		[ticker, error] = TickerParser.execute_parser_request(b"match_ticker", [tickerId.encode(), exchangeId.encode(), platform.encode(), bias.encode()])
+		[ticker, error] = TickerParser.execute_cached_request(b"match_ticker", [tickerId.encode(), exchangeId.encode(), platform.encode(), bias.encode()])
 		ticker = None if ticker == b"" else loads(ticker)
 		error = None if error == b"" else error.decode()
 		return ticker, error
 
+	@staticmethod
+	def match_ticker_batch(queries):
+		responses, missing, parameters = [None] * len(queries), [], []
+		with TickerParser.cacheLock:
+			for i, (tickerId, exchange, platform, bias) in enumerate(queries):
+				exchangeId = exchange.get("id").lower() if bool(exchange) else ""
+				query = [tickerId.encode(), exchangeId.encode(), platform.encode(), bias.encode()]
+				responses[i] = TickerParser.get_cached_response((b"match_ticker", *query))
+				if responses[i] is None:
+					missing.append(i)
+					parameters += query
+
+		if len(missing) != 0:
+			generation, response = TickerParser.send_parser_request(b"match_ticker_batch", parameters)
+			with TickerParser.cacheLock:
+				TickerParser.check_generation(generation)
+				for n, i in enumerate(missing):
+					responses[i] = response[n * 2:n * 2 + 2]
+					TickerParser.cache_response((b"match_ticker", *parameters[n * 4:n * 4 + 4]), responses[i], generation)
+
+		results = []
+		for ticker, error in responses:
+			results.append((None if ticker == b"" else loads(ticker), None if error == b"" else error.decode()))
+		return results
+
 	@staticmethod
 	def check_if_fiat(tickerId):
-		[success, fiat] = TickerParser.execute_parser_request(b"check_if_fiat", [tickerId.encode()])
+		[success, fiat] = TickerParser.execute_cached_request(b"check_if_fiat", [tickerId.encode()])
 		return bool(int(success)), fiat
 
 	@staticmethod
 	def get_listings(tickerBase, tickerQuote):
-		[listings, total] = TickerParser.execute_parser_request(b"get_listings", [tickerBase.encode(), tickerQuote.encode()])
+		[listings, total] = TickerParser.execute_cached_request(b"get_listings", [tickerBase.encode(), tickerQuote.encode()])
 		return loads(listings), int(total)
 
+	@staticmethod
+	def get_precision_table(exchangeId):
+		if exchangeId in TickerParser.precisionTables:
+			expiry, table = TickerParser.precisionTables[exchangeId]
+			if expiry > time(): return table
+		response = TickerParser.execute_parser_request(b"get_precision_table", [exchangeId.encode()])
+		# A failed lookup is kept as an empty table, markets missing from it are formatted by the parser
+		table = loads(response[0]) if len(response) == 1 else {"precisionMode": None, "markets": {}}
+		TickerParser.precisionTables[exchangeId] = (time() + PRECISION_TABLE_TTL, table)
+		return table
+
+	@staticmethod
+	def format_with_precision_table(table, kind, symbol, value):
+		if symbol not in table["markets"]: return None
+		pricePrecision, amountPrecision = table["markets"][symbol]
+		if kind == "price": return dtp.decimal_to_precision(str(value), rounding_mode=dtp.ROUND, precision=pricePrecision, counting_mode=table["precisionMode"], padding_mode=dtp.PAD_WITH_ZERO)
+		else: return dtp.decimal_to_precision(str(value), rounding_mode=dtp.TRUNCATE, precision=amountPrecision, counting_mode=table["precisionMode"], padding_mode=dtp.NO_PADDING)
+
+	@staticmethod
+	def get_formatted_ccxt_batch(requests):
+		# Markets with a cached precision table are formatted locally, the rest is formatted by the parser in one request
+		results, missing = [None] * len(requests), []
+		for i, (kind, exchangeId, symbol, value) in enumerate(requests):
+			try: results[i] = TickerParser.format_with_precision_table(TickerParser.get_precision_table(exchangeId), kind, symbol, value)
+			except: pass
+			if results[i] is None: missing.append(i)
+
+		if len(missing) != 0:
+			parameters = []
+			for i in missing:
+				kind, exchangeId, symbol, value = requests[i]
+				parameters += [kind.encode(), exchangeId.encode(), symbol.encode(), str(value).encode()]
+			response = TickerParser.execute_parser_request(b"get_formatted_ccxt_batch", parameters)
+			for i, formatted in zip(missing, response):
+				results[i] = None if formatted == b"" else formatted.decode()
+		return results
+
 	@staticmethod
 	def get_formatted_price_ccxt(exchangeId, symbol, price):
-		[response] = TickerParser.execute_parser_request(b"get_formatted_price_ccxt", [exchangeId.encode(), symbol.encode(), str(price).encode()])
-		return response.decode()
+		[response] = TickerParser.get_formatted_ccxt_batch([("price", exchangeId, symbol, price)])
+		if response is None: raise Exception("price could not be formatted")
+		return response
 
 	@staticmethod
 	def get_formatted_amount_ccxt(exchangeId, symbol, amount):
-		[response] = TickerParser.execute_parser_request(b"get_formatted_amount_ccxt", [exchangeId.encode(), symbol.encode(), str(amount).encode()])
-		return response.decode()
+		[response] = TickerParser.get_formatted_ccxt_batch([("amount", exchangeId, symbol, amount)])
+		if response is None: raise Exception("amount could not be formatted")
+		return response
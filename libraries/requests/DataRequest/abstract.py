@@ -1,5 +1,5 @@
 from sys import maxsize as MAXSIZE
-from asyncio import wait
+from asyncio import gather
 from traceback import format_exc
 
 from TickerParser import TickerParser
@@ -11,10 +11,14 @@ class AbstractRequestHandler(object):
 		self.requests = {}
 
 	async def process_ticker(self):
-		tasks = set()
-		for platform, request in self.requests.items():
-			tasks.add(request.process_ticker())
-		await wait(tasks)
+		# Tickers of all platforms are resolved in a single parser request
+		requests = list(self.requests.values())
+		queries = await gather(*[request.prepare_ticker() for request in requests])
+		results = [(None, None)] * len(requests)
+		try: results = await TickerParser.match_ticker_batch(queries)
+		except: print(format_exc())
+		for request, (updatedTicker, error) in zip(requests, results):
+			request.update_ticker(updatedTicker, error)
 
 	def get_preferred_platform(self):
 		currentMinimumErrors = MAXSIZE
@@ -52,6 +56,16 @@ class AbstractRequest(object):
 		self.errorIsFatal = False
 		self.couldFail = False
 
+	async def process_ticker(self):
+		updatedTicker, error = None, None
+		try: updatedTicker, error = await TickerParser.match_ticker(*(await self.prepare_ticker()))
+		except: pass
+		self.update_ticker(updatedTicker, error)
+
+	async def prepare_ticker(self): raise NotImplementedError
+
+	def update_ticker(self, updatedTicker, error): raise NotImplementedError
+
 	async def add_timeframe(self, argument):
 		timeframeSupported, parsedTimeframe = self.add_parameter(argument, "timeframes")
 		if parsedTimeframe is not None and not self.has_parameter(parsedTimeframe.id, self.timeframes):
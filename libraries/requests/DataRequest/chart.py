@@ -456,11 +456,10 @@ class ChartRequest(AbstractRequest):
 		self.currentTimeframe = None
 		self.hasExchange = False
 
-	async def process_ticker(self):
-		updatedTicker, error = None, None
-		try: updatedTicker, error = await TickerParser.match_ticker(self.tickerId, self.exchange, self.platform, self.parserBias)
-		except: print(format_exc())
+	async def prepare_ticker(self):
+		return self.tickerId, self.exchange, self.platform, self.parserBias
 
+	def update_ticker(self, updatedTicker, error):
 		if error is not None:
 			self.set_error(error, isFatal=True)
 		elif not updatedTicker:
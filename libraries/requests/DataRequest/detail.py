@@ -91,11 +91,10 @@ class DetailRequest(AbstractRequest):
 
 		self.preferences = []
 
-	async def process_ticker(self):
-		updatedTicker, error = None, None
-		try: updatedTicker, error = await TickerParser.match_ticker(self.tickerId, None, self.platform, self.parserBias)
-		except: pass
+	async def prepare_ticker(self):
+		return self.tickerId, None, self.platform, self.parserBias
 
+	def update_ticker(self, updatedTicker, error):
 		if error is not None:
 			self.set_error(error, isFatal=True)
 		elif not updatedTicker:
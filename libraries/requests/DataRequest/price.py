@@ -200,7 +200,7 @@ class PriceRequest(AbstractRequest):
 
 		self.hasExchange = False
 
-	async def process_ticker(self):
+	async def prepare_ticker(self):
 		preferences = [{"id": e.id, "value": e.parsed[self.platform]} for e in self.preferences]
 		if any([e.get("id") in ["funding", "oi"] for e in preferences]):
 			if not self.hasExchange:
@@ -211,10 +211,9 @@ class PriceRequest(AbstractRequest):
 				try: _, self.exchange = await TickerParser.find_exchange("bitfinex", self.platform, self.parserBias)
 				except: pass
 
-		updatedTicker, error = None, None
-		try: updatedTicker, error = await TickerParser.match_ticker(self.tickerId, self.exchange, self.platform, self.parserBias)
-		except: pass
+		return self.tickerId, self.exchange, self.platform, self.parserBias
 
+	def update_ticker(self, updatedTicker, error):
 		if error is not None:
 			self.set_error(error, isFatal=True)
 		elif not updatedTicker:
@@ -99,15 +99,10 @@ class TradeRequest(AbstractRequest):
 
 		self.hasExchange = False
 
-	async def process_ticker(self):
-		for i in range(len(self.ticker.parts)):
-			tickerPart = self.ticker.parts[i]
-			if type(tickerPart) is str: continue
-
-		updatedTicker, error = None, None
-		try: updatedTicker, error = await TickerParser.match_ticker(self.tickerId, self.exchange, self.platform, self.parserBias)
-		except: pass
+	async def prepare_ticker(self):
+		return self.tickerId, self.exchange, self.platform, self.parserBias
 
+	def update_ticker(self, updatedTicker, error):
 		if error is not None:
 			self.set_error(error, isFatal=True)
 		elif not updatedTicker:
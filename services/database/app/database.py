@@ -1,22 +1,36 @@
-from os import environ
+from os import environ, path, makedirs, replace
 from signal import signal, SIGINT, SIGTERM
 from time import time, sleep
 from math import ceil
-from zmq import Context, device, XREP, XREQ, QUEUE, ROUTER, NOBLOCK
-from orjson import dumps
+from zmq import Context, device, XREP, XREQ, QUEUE, ROUTER, PUB, NOBLOCK
+from orjson import dumps, loads
 from traceback import format_exc
 from threading import Thread, Lock
+from multiprocessing import get_context
+from queue import Queue, Empty, Full
+from tempfile import NamedTemporaryFile
+from uuid import uuid4
 
 import stripe
 from google.cloud.firestore import Client as FirestoreClient
 from google.cloud.firestore import DELETE_FIELD
 from google.cloud.error_reporting import Client as ErrorReportingClient
 from helpers.utils import Utils
+from helpers.changelog import ChangeLog
+from helpers.projection import Projection
 
 
 database = FirestoreClient()
 stripe.api_key = environ["STRIPE_KEY"]
 
+SNAPSHOT_DIRECTORY = "snapshots"
+SNAPSHOT_INTERVAL = 60
+REPLICA_QUEUE_SIZE = 4096
+
+# Only the fields clients read are kept and served, anything else stays in Firestore
+ACCOUNT_PROJECTION = Projection(environ.get("ACCOUNT_PROJECTION", "apiKeys,commandPresets,customer.addons,customer.personalSubscription,oauth.discord.userId,paperTrader,settings.charts.preferredOrder").split(","))
+GUILD_PROJECTION = Projection(environ.get("GUILD_PROJECTION", "addons,overrides,settings,stale").split(","))
+
 
 class DatabaseHandler(object):
 	accountsReady = False
@@ -27,27 +41,60 @@ class DatabaseHandler(object):
 	guildProperties = {}
 	accountIdMap = {}
 
-	def __init__(self):
+	# Properties are serialized once when they change instead of on every fetch
+	accountPayloads = {}
+	guildPayloads = {}
+
+	def __init__(self, isReplica=False):
 		self.isServiceAvailable = True
-		self.isManager = False if len(environ["HOSTNAME"].split("-")) != 2 else environ["HOSTNAME"].split("-")[1] == "0"
-		if self.isManager: print("[Startup]: This instance is a database manager")
+		self.isManager = False if isReplica or len(environ["HOSTNAME"].split("-")) != 2 else environ["HOSTNAME"].split("-")[1] == "0"
+		if isReplica: print("[Startup]: This process is a read replica")
+		elif self.isManager: print("[Startup]: This instance is a database manager")
 		else: print("[Startup]: This instance is a slave")
 		signal(SIGINT, self.exit_gracefully)
 		signal(SIGTERM, self.exit_gracefully)
 
 		self.accountLock = Lock()
 		self.guildLock = Lock()
+		self.accountKeys = ChangeLog()
+		self.guildKeys = ChangeLog()
+		self.staleGuilds = set()
 
 		self.logging = ErrorReportingClient(service="database")
 
 		self.context = Context.instance()
-
+		self.replicaConnections = []
+		if isReplica: return
+
+		# Writes and billing triggered by snapshots are applied in the background, snapshot handlers and key reads never wait on them
+		self.sideEffects = Queue()
+		self.billedSatellites = {}
+		self.clearingStaleGuilds = set()
+		Thread(target=self.run_side_effects, daemon=True).start()
+
+		# Clients keep local copies of fetched properties and patch them from the changes published here
+		self.publisherLock = Lock()
+		self.publisherId = uuid4().hex.encode()
+		self.publishedCount = 0
+		self.publisher = self.context.socket(PUB)
+		self.publisher.bind("tcp://*:6901")
+
+		# A snapshot left by a previous run is served right away while the listeners catch up in the background
+		self.loadedSources = set()
+		self.restoredKeys = None
+		if self.load_snapshot(): Thread(target=self.attach_listeners).start()
+		else: self.attach_listeners()
+
+	def attach_listeners(self):
 		self.accountsLink = database.collection("accounts").on_snapshot(self.update_account_properties)
-		while not self.accountsReady: sleep(1)
+		while "accounts" not in self.loadedSources: sleep(1)
 		self.discordPropertiesGuildsLink = database.collection("discord/properties/guilds").on_snapshot(self.update_guild_properties)
-		while not self.guildsReady: sleep(1)
+		while "guilds" not in self.loadedSources: sleep(1)
 		self.discordPropertiesUnregisteredUsersLink = database.collection("discord/properties/users").on_snapshot(self.update_unregistered_users_properties)
-		while not self.usersReady: sleep(1)
+		while "users" not in self.loadedSources: sleep(1)
+
+		if self.restoredKeys is not None: self.reconcile_snapshot()
+		Thread(target=self.save_snapshots, daemon=True).start()
 
 	def exit_gracefully(self):
 		print("[Startup]: Database handler is exiting")
@@ -75,24 +122,30 @@ class DatabaseHandler(object):
 
 		while self.isServiceAvailable:
 			try:
-				response = None
+				response, payload = None, None
 				message = socket.recv_multipart()
-				if len(message) != 6: continue
-				queue, origin, delimeter, service, timestamp, entityId = message
+				if len(message) < 6: continue
+				queue, origin, delimeter, service, timestamp, entityId, *parameters = message
 				if int(timestamp.decode()) < time() * 1000:
 					print("Request received too late")
 					continue
 
 				if service == b"account_fetch":
-					response = self.accountProperties.get(entityId.decode())
+					payload = self.accountPayloads.get(entityId.decode())
 				elif service == b"guild_fetch":
-					response = self.guildProperties.get(entityId.decode())
+					payload = self.guildPayloads.get(entityId.decode())
 				elif service == b"account_keys":
 					response = self.get_account_keys()
 				elif service == b"guild_keys":
 					response = self.get_guild_keys()
+				elif service == b"account_keys_since":
+					response = self.get_account_keys_since(float(entityId.decode()))
+				elif service == b"guild_keys_since":
+					response = self.get_guild_keys_since(float(entityId.decode()))
 				elif service == b"account_match":
 					response = self.accountIdMap.get(entityId.decode())
+				elif service == b"context_fetch":
+					payload = self.get_context(entityId.decode(), parameters[0].decode(), parameters[1] == b"1")
 				elif service == b"account_status":
 					response = self.accountsReady and self.usersReady
 				elif service == b"guild_status":
@@ -103,12 +156,116 @@ class DatabaseHandler(object):
 				print(format_exc())
 				if environ["PRODUCTION_MODE"]: self.logging.report_exception()
 			finally:
-				try: socket.send_multipart([queue, origin, delimeter, dumps(response)], flags=NOBLOCK)
+				try: socket.send_multipart([queue, origin, delimeter, dumps(response) if payload is None else payload], flags=NOBLOCK)
 				except: pass
 
 		socket.close()
 
+	def start_replicas(self, count):
+		# Lookups are served by read-only replicas in separate processes, this process only follows the database and forwards changes
+		processContext = get_context("spawn")
+		for i in range(count):
+			receiver, sender = processContext.Pipe(duplex=False)
+			processContext.Process(target=DatabaseHandler.serve_replica, args=(receiver,), daemon=True).start()
+			changes = Queue(maxsize=REPLICA_QUEUE_SIZE)
+			self.replicaConnections.append(changes)
+			Thread(target=self.forward_changes, args=(sender, changes), daemon=True).start()
+		Thread(target=self.sweep_stale_guilds, daemon=True).start()
+
+	@staticmethod
+	def serve_replica(connection):
+		replica = DatabaseHandler(isReplica=True)
+		while replica.isServiceAvailable:
+			kind, message = connection.recv()
+			if kind == b"changes":
+				replica.apply_replicated_changes(*message)
+			else:
+				replica.load_replicated_state(*message)
+				if not replica.accountsReady:
+					replica.accountsReady, replica.guildsReady, replica.usersReady = True, True, True
+					Thread(target=replica.run, daemon=True).start()
+
+	def replicate(self, mode, source, readTime, changes):
+		# Must be called with the lock of the changed properties held, so replicas receive changes in the order they were applied
+		for connection in self.replicaConnections:
+			try:
+				connection.put_nowait((mode, source, readTime, changes))
+			except Full:
+				# The replica fell behind, queued changes are dropped and it's sent the full state instead
+				DatabaseHandler.drain_queue(connection)
+				connection.put_nowait(None)
+
+	def forward_changes(self, connection, changes):
+		# Every replica is fed from its own thread, a slow replica never holds up the listeners or the other replicas
+		isSynced = False
+		while self.isServiceAvailable:
+			if not isSynced:
+				connection.send((b"state", self.copy_replicated_state(changes)))
+				isSynced = True
+			change = changes.get()
+			if change is None: isSynced = False
+			else: connection.send((b"changes", change))
+
+	def copy_replicated_state(self, changes):
+		# Payloads are immutable, so shallow copies are enough and the state is serialized after the locks are released
+		with self.accountLock, self.guildLock:
+			# Anything still queued is already part of the copied state
+			DatabaseHandler.drain_queue(changes)
+			return (dict(self.accountPayloads), dict(self.accountIdMap), self.accountKeys.copy(), dict(self.guildPayloads), self.guildKeys.copy())
+
+	def load_replicated_state(self, accountPayloads, accountIdMap, accountKeys, guildPayloads, guildKeys):
+		with self.accountLock, self.guildLock:
+			self.accountProperties = {accountId: loads(payload) for accountId, payload in accountPayloads.items()}
+			self.guildProperties = {guildId: loads(payload) for guildId, payload in guildPayloads.items()}
+			self.accountPayloads, self.accountIdMap, self.accountKeys, self.guildPayloads, self.guildKeys = accountPayloads, accountIdMap, accountKeys, guildPayloads, guildKeys
+
+	@staticmethod
+	def drain_queue(queue):
+		try:
+			while True: queue.get_nowait()
+		except Empty:
+			pass
+
+	def apply_replicated_changes(self, mode, source, readTime, changes):
+		if mode == b"account":
+			properties, payloads, keys, lock = self.accountProperties, self.accountPayloads, self.accountKeys, self.accountLock
+		else:
+			properties, payloads, keys, lock = self.guildProperties, self.guildPayloads, self.guildKeys, self.guildLock
+
+		with lock:
+			for kind, key, value in changes:
+				if kind == b"match":
+					if value == b"null": self.accountIdMap.pop(key, None)
+					else: self.accountIdMap[key] = loads(value)
+				elif value == b"null":
+					properties.pop(key, None)
+					payloads.pop(key, None)
+				else:
+					properties[key] = loads(value)
+					payloads[key] = value
+			keys.record(source, [key for kind, key, value in changes if kind == b"fetch"], readTime)
+
+	def sweep_stale_guilds(self):
+		# Replicas don't track stale guilds, so the flags are cleared here instead of when keys are requested
+		while self.isServiceAvailable:
+			sleep(900)
+			with self.guildLock:
+				self.clear_stale_guilds()
+
+	def publish_changes(self, mode, changes):
+		if len(changes) == 0: return
+		message = []
+		for kind, key, value in changes:
+			message += [kind, key.encode(), value]
+		with self.publisherLock:
+			# Messages are numbered, so subscribers can tell when they missed some or the service restarted
+			self.publishedCount += 1
+			self.publisher.send_multipart([mode, self.publisherId + b":" + str(self.publishedCount).encode(), *message])
+
 	def update_account_properties(self, settings, changes, timestamp):
+		# The initial snapshot is not published, clients can't have anything cached before the service is ready
+		isReady, published = self.accountsReady, []
+		self.confirm_restored_keys("accounts", "account", settings)
 		try:
 			for change in changes:
 				properties = change.document.to_dict()
@@ -118,30 +275,47 @@ class DatabaseHandler(object):
 				for key in properties["apiKeys"]:
 					properties["apiKeys"][key].pop("secret")
 					properties["apiKeys"][key].pop("passphrase", None)
+				properties = ACCOUNT_PROJECTION.apply(properties)
 
 				with self.accountLock:
 					if change.type.name in ["ADDED", "MODIFIED"]:
+						payload = dumps(properties)
+						if payload != self.accountPayloads.get(accountId): published.append((b"fetch", accountId, payload))
 						self.accountProperties[accountId] = properties
+						self.accountPayloads[accountId] = payload
 						userId = properties["oauth"]["discord"].get("userId")
 						if userId is not None:
 							if userId in self.accountProperties:
 								self.accountProperties.pop(userId)
+								self.accountPayloads.pop(userId)
 							self.accountIdMap[userId] = accountId
 							self.accountIdMap[accountId] = userId
+							published += [(b"fetch", userId, b"null"), (b"match", userId, dumps(accountId)), (b"match", accountId, dumps(userId))]
 					else:
 						userId = self.accountProperties[accountId]["oauth"]["discord"].get("userId")
 						if userId is not None:
 							self.accountIdMap.pop(self.accountIdMap.get(accountId))
 							self.accountIdMap.pop(accountId)
+							published += [(b"match", userId, b"null"), (b"match", accountId, b"null")]
 						self.accountProperties.pop(accountId)
+						self.accountPayloads.pop(accountId)
+						published.append((b"fetch", accountId, b"null"))
 
 			self.accountsReady = True
+			self.loadedSources.add("accounts")
 
 		except Exception:
 			print(format_exc())
 			if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=accountId)
+		finally:
+			with self.accountLock:
+				self.accountKeys.record("accounts", [key for kind, key, value in published if kind == b"fetch"], timestamp.timestamp())
+				self.replicate(b"account", "accounts", timestamp.timestamp(), published)
+			if isReady: self.publish_changes(b"account", published)
 
 	def update_unregistered_users_properties(self, settings, changes, timestamp):
+		isReady, published = self.usersReady, []
+		self.confirm_restored_keys("users", "account", settings)
 		try:
 			for change in changes:
 				properties = change.document.to_dict()
@@ -155,39 +329,154 @@ class DatabaseHandler(object):
 				properties.pop("trace", None)
 				properties.pop("credit", None)
 				if not properties: continue
+				properties = ACCOUNT_PROJECTION.apply(properties)
 
 				with self.accountLock:
 					if change.type.name in ["ADDED", "MODIFIED"]:
+						payload = dumps(properties)
+						if payload != self.accountPayloads.get(accountId): published.append((b"fetch", accountId, payload))
 						self.accountProperties[accountId] = properties
+						self.accountPayloads[accountId] = payload
 					else:
 						self.accountProperties.pop(accountId)
+						self.accountPayloads.pop(accountId)
+						published.append((b"fetch", accountId, b"null"))
 
 			self.usersReady = True
+			self.loadedSources.add("users")
 
 		except Exception:
 			print(format_exc())
 			if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=accountId)
+		finally:
+			with self.accountLock:
+				self.accountKeys.record("users", [key for kind, key, value in published], timestamp.timestamp())
+				self.replicate(b"account", "users", timestamp.timestamp(), published)
+			if isReady: self.publish_changes(b"account", published)
 
 	def update_guild_properties(self, settings, changes, timestamp):
+		isReady, published = self.guildsReady, []
+		self.confirm_restored_keys("guilds", "guild", settings)
 		try:
 			for change in changes:
 				guildId = change.document.id
 				properties = change.document.to_dict()
+				self.clearingStaleGuilds.discard(guildId)
 
 				# Validation
 				if self.isManager and self.guild_validation(guildId, properties): continue
+				# Guilds are served with the settings template already filled in, clients don't normalize them again
+				properties = Utils.create_guild_settings(GUILD_PROJECTION.apply(properties))
 
 				with self.guildLock:
 					if change.type.name in ["ADDED", "MODIFIED"]:
+						payload = dumps(properties)
+						if payload != self.guildPayloads.get(guildId): published.append((b"fetch", guildId, payload))
 						self.guildProperties[guildId] = properties
+						self.guildPayloads[guildId] = payload
+						if "stale" in properties: self.staleGuilds.add(guildId)
+						else: self.staleGuilds.discard(guildId)
 					else:
 						self.guildProperties.pop(guildId, None)
+						self.guildPayloads.pop(guildId, None)
+						published.append((b"fetch", guildId, b"null"))
+						self.staleGuilds.discard(guildId)
 
 			self.guildsReady = True
+			self.loadedSources.add("guilds")
 
 		except Exception:
 			print(format_exc())
 			if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=guildId)
+		finally:
+			with self.guildLock:
+				self.guildKeys.record("guilds", [key for kind, key, value in published], timestamp.timestamp())
+				self.replicate(b"guild", "guilds", timestamp.timestamp(), published)
+			if isReady: self.publish_changes(b"guild", published)
+
+	def load_snapshot(self):
+		try:
+			with open(path.join(SNAPSHOT_DIRECTORY, "properties"), "rb") as snapshot:
+				snapshot = loads(snapshot.read())
+		except FileNotFoundError:
+			return False
+		except Exception:
+			print(format_exc())
+			return False
+
+		self.accountProperties, self.guildProperties, self.accountIdMap = snapshot["accounts"], snapshot["guilds"], snapshot["accountIdMap"]
+		self.accountPayloads = {accountId: dumps(properties) for accountId, properties in self.accountProperties.items()}
+		self.guildPayloads = {guildId: dumps(properties) for guildId, properties in self.guildProperties.items()}
+		self.staleGuilds = {guildId for guildId, properties in self.guildProperties.items() if "stale" in properties}
+		self.accountKeys.restore(snapshot["readTimes"]["account"])
+		self.guildKeys.restore(snapshot["readTimes"]["guild"])
+		self.restoredKeys = {"account": set(self.accountProperties), "guild": set(self.guildProperties)}
+		self.accountsReady, self.guildsReady, self.usersReady = True, True, True
+		print("[Startup]: Database handler restored {} accounts and {} guilds from a snapshot".format(len(self.accountProperties), len(self.guildProperties)))
+		return True
+
+	def save_snapshots(self):
+		savedVersion = None
+		while self.isServiceAvailable:
+			version = (self.accountKeys.version(), self.guildKeys.version())
+			if version != savedVersion:
+				self.save_snapshot()
+				savedVersion = version
+			sleep(SNAPSHOT_INTERVAL)
+
+	def save_snapshot(self):
+		try:
+			# Snapshots are assembled from the already serialized payloads
+			with self.accountLock, self.guildLock:
+				accounts = b"{" + b",".join([dumps(accountId) + b":" + payload for accountId, payload in self.accountPayloads.items()]) + b"}"
+				guilds = b"{" + b",".join([dumps(guildId) + b":" + payload for guildId, payload in self.guildPayloads.items()]) + b"}"
+				accountIdMap = dumps(self.accountIdMap)
+				readTimes = dumps({"account": self.accountKeys.readTimes, "guild": self.guildKeys.readTimes})
+
+			makedirs(SNAPSHOT_DIRECTORY, exist_ok=True)
+			# Replicas on the same node share the directory, each one writes to its own file before swapping it in
+			with NamedTemporaryFile(dir=SNAPSHOT_DIRECTORY, delete=False) as snapshot:
+				snapshot.write(b'{"accounts":' + accounts + b',"guilds":' + guilds + b',"accountIdMap":' + accountIdMap + b',"readTimes":' + readTimes + b"}")
+			replace(snapshot.name, path.join(SNAPSHOT_DIRECTORY, "properties"))
+		except Exception:
+			print(format_exc())
+
+	def confirm_restored_keys(self, source, mode, documents):
+		# Restored entries are kept only if the first snapshot from the database still contains them
+		if self.restoredKeys is None or source in self.loadedSources: return
+		self.restoredKeys[mode].difference_update([document.id for document in documents])
+
+	def reconcile_snapshot(self):
+		published = []
+		with self.accountLock:
+			for accountId in self.restoredKeys["account"]:
+				properties = self.accountProperties.pop(accountId, None)
+				if properties is None: continue
+				self.accountPayloads.pop(accountId)
+				published.append((b"fetch", accountId, b"null"))
+				userId = properties.get("oauth", {}).get("discord", {}).get("userId")
+				if userId is not None and self.accountIdMap.get(accountId) == userId:
+					self.accountIdMap.pop(accountId)
+					self.accountIdMap.pop(userId, None)
+					published += [(b"match", userId, b"null"), (b"match", accountId, b"null")]
+			readTime = self.accountKeys.readTimes["accounts"]
+			self.accountKeys.record("accounts", [key for kind, key, value in published if kind == b"fetch"], readTime)
+			self.replicate(b"account", "accounts", readTime, published)
+		self.publish_changes(b"account", published)
+
+		published = []
+		with self.guildLock:
+			for guildId in self.restoredKeys["guild"]:
+				if self.guildProperties.pop(guildId, None) is None: continue
+				self.guildPayloads.pop(guildId)
+				self.staleGuilds.discard(guildId)
+				published.append((b"fetch", guildId, b"null"))
+			readTime = self.guildKeys.readTimes["guilds"]
+			self.guildKeys.record("guilds", [key for kind, key, value in published], readTime)
+			self.replicate(b"guild", "guilds", readTime, published)
+		self.publish_changes(b"guild", published)
+
+		self.restoredKeys = None
 
 	def get_account_keys(self):
 		response = {}
@@ -199,20 +488,103 @@ class DatabaseHandler(object):
 	def get_guild_keys(self):
 		response = {}
 		with self.guildLock:
+			self.clear_stale_guilds()
 			for guildId, properties in self.guildProperties.items():
-				if properties.get("stale", {}).get("timestamp", time()) <= time() - 86400:
-					database.document("discord/properties/guilds/{}".format(guildId)).set({"stale": DELETE_FIELD}, merge=True)
 				response[guildId] = properties.get("settings", {}).get("setup", {}).get("connection")
 		return response
 
+	def get_account_keys_since(self, version):
+		with self.accountLock:
+			keys = self.accountKeys.since(version)
+			isFull = keys is None
+			if isFull: keys = self.accountProperties.keys()
+			changed = {key: self.accountProperties[key].get("oauth", {}).get("discord", {}).get("userId") for key in keys if key in self.accountProperties}
+			removed = [key for key in keys if key not in self.accountProperties]
+			return {"version": self.accountKeys.version(), "full": isFull, "changed": changed, "removed": removed}
+
+	def get_guild_keys_since(self, version):
+		with self.guildLock:
+			self.clear_stale_guilds()
+			keys = self.guildKeys.since(version)
+			isFull = keys is None
+			if isFull: keys = self.guildProperties.keys()
+			changed = {key: self.guildProperties[key].get("settings", {}).get("setup", {}).get("connection") for key in keys if key in self.guildProperties}
+			removed = [key for key in keys if key not in self.guildProperties]
+			return {"version": self.guildKeys.version(), "full": isFull, "changed": changed, "removed": removed}
+
+	def clear_stale_guilds(self):
+		for guildId in self.staleGuilds:
+			if self.guildProperties[guildId]["stale"].get("timestamp", time()) <= time() - 86400:
+				self.clear_stale_flag(guildId)
+
+	def clear_stale_flag(self, guildId):
+		# The flag is only cleared once, it's queued again after the guild changes or the write fails
+		if guildId in self.clearingStaleGuilds: return
+		self.clearingStaleGuilds.add(guildId)
+		self.sideEffects.put(("stale", guildId, None))
+
+	def run_side_effects(self):
+		while self.isServiceAvailable:
+			tasks = [self.sideEffects.get()]
+			while len(tasks) < 500 and not self.sideEffects.empty():
+				tasks.append(self.sideEffects.get())
+
+			batch, paths, staleGuilds = database.batch(), set(), []
+			for action, path, properties in tasks:
+				try:
+					guildId = path if action == "stale" else None
+					if action == "satellites": action, path, properties = self.bill_satellites(path, *properties)
+					elif action == "stale": action, path, properties = "merge", "discord/properties/guilds/{}".format(path), {"stale": DELETE_FIELD}
+					if path in paths:
+						self.commit_batch(batch, staleGuilds)
+						batch, paths, staleGuilds = database.batch(), set(), []
+					paths.add(path)
+					if guildId is not None: staleGuilds.append(guildId)
+					if action == "delete": batch.delete(database.document(path))
+					elif action == "merge": batch.set(database.document(path), properties, merge=True)
+					else: batch.set(database.document(path), properties)
+				except Exception:
+					print(format_exc())
+					if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=path)
+			self.commit_batch(batch, staleGuilds)
+
+	def commit_batch(self, batch, staleGuilds):
+		try: batch.commit()
+		except Exception:
+			self.clearingStaleGuilds.difference_update(staleGuilds)
+			print(format_exc())
+			if environ["PRODUCTION_MODE"]: self.logging.report_exception()
+
+	def bill_satellites(self, guildId, subscriptionId, satelliteCount, billedCount):
+		try:
+			subscription = stripe.Subscription.retrieve(subscriptionId)
+			cycleRatio = (subscription["current_period_end"] - time()) / (subscription["current_period_end"] - subscription["current_period_start"])
+			quantity = int(ceil((satelliteCount - billedCount) * 20 * cycleRatio))
+			stripe.SubscriptionItem.create_usage_record(subscription["items"]["data"][0]["id"], quantity=quantity, timestamp=int(time()), action="increment")
+		except:
+			# Billing is retried with the next change to the guild
+			self.billedSatellites.pop(guildId, None)
+			raise
+		# Billed counts only hold for the period they were charged in, counts of past periods are dropped
+		self.billedSatellites[guildId] = (satelliteCount, subscription["current_period_end"])
+		for billedGuildId, (_, periodEnd) in list(self.billedSatellites.items()):
+			if periodEnd is not None and periodEnd <= time(): self.billedSatellites.pop(billedGuildId, None)
+		return "merge", "discord/properties/guilds/{}".format(guildId), {"addons": {"satellites": {"enabled": True, "count": satelliteCount}}}
+
+	def get_context(self, authorId, guildId, isWebhook):
+		with self.accountLock:
+			accountId = None if isWebhook else self.accountIdMap.get(authorId)
+			accountPayload = self.accountPayloads.get(authorId if accountId is None else accountId, b"null")
+		return b'{"guildProperties":' + self.guildPayloads.get(guildId, b"null") + b',"accountId":' + dumps(accountId) + b',"accountProperties":' + accountPayload + b"}"
+
 	def unregistered_user_validation(self, accountId, properties):
 		try:
 			if "commandPresets" in properties and len(properties["commandPresets"]) == 0:
 				properties.pop("commandPresets")
-				database.document("discord/properties/users/{}".format(accountId)).set(properties)
+				self.sideEffects.put(("set", "discord/properties/users/{}".format(accountId), properties))
 				return True
 			if not properties:
-				database.document("discord/properties/users/{}".format(accountId)).delete()
+				self.sideEffects.put(("delete", "discord/properties/users/{}".format(accountId), None))
 				return True
 		except:
 			print(format_exc())
@@ -222,34 +594,35 @@ class DatabaseHandler(object):
 	def guild_validation(self, guildId, properties):
 		try:
 			if "addons" not in properties or "settings" not in properties:
-				database.document("discord/properties/guilds/{}".format(guildId)).set(Utils.create_guild_settings(properties))
+				self.sideEffects.put(("set", "discord/properties/guilds/{}".format(guildId), Utils.create_guild_settings(properties)))
 				return True
 			if "stale" in properties:
 				if properties["stale"].get("count", 0) >= 96:
-					database.document("discord/properties/guilds/{}".format(guildId)).delete()
+					self.sideEffects.put(("delete", "discord/properties/guilds/{}".format(guildId), None))
 					return True
 				elif properties["stale"].get("timestamp", time()) <= time() - 86400:
-					database.document("discord/properties/guilds/{}".format(guildId)).set({"stale": DELETE_FIELD}, merge=True)
+					self.clear_stale_flag(guildId)
 					return True
 			if properties["addons"]["satellites"]["enabled"]:
 				addedSatellites = properties["addons"]["satellites"].get("added", [])
 				satelliteCount = len(addedSatellites)
-				if satelliteCount > properties["addons"]["satellites"].get("count", 0):
+				# Satellites billed in the current period are not counted again until the new count is written back
+				billedCount = properties["addons"]["satellites"].get("count", 0)
+				pendingCount, periodEnd = self.billedSatellites.get(guildId, (0, None))
+				if pendingCount <= billedCount or (periodEnd is not None and periodEnd <= time()): self.billedSatellites.pop(guildId, None)
+				else: billedCount = pendingCount
+				if satelliteCount > billedCount:
 					accountProperties = self.accountProperties.get(properties["addons"]["satellites"].get("connection"))
 					if accountProperties["customer"]["personalSubscription"].get("subscription") is not None:
 						if environ["PRODUCTION_MODE"]:
-							subscription = stripe.Subscription.retrieve(accountProperties["customer"]["personalSubscription"]["subscription"])
-							cycleRatio = (subscription["current_period_end"] - time()) / (subscription["current_period_end"] - subscription["current_period_start"])
-							quantity = int(ceil((satelliteCount - properties["addons"]["satellites"].get("count", 0)) * 20 * cycleRatio))
-							stripe.SubscriptionItem.create_usage_record(subscription["items"]["data"][0]["id"], quantity=quantity, timestamp=int(time()), action="increment")
-							database.document("discord/properties/guilds/{}".format(guildId)).set({"addons": {"satellites": {"enabled": True, "count": satelliteCount}}}, merge=True)
-							return True
+							self.billedSatellites[guildId] = (satelliteCount, None)
+							self.sideEffects.put(("satellites", guildId, (accountProperties["customer"]["personalSubscription"]["subscription"], satelliteCount, billedCount)))
 						else:
 							print("{}: {} satellites".format(guildId, satelliteCount))
 			elif properties["addons"]["satellites"].get("count") is not None:
 				properties["addons"]["satellites"].pop("count", None)
 				properties["addons"]["satellites"].pop("added", None)
-				database.document("discord/properties/guilds/{}".format(guildId)).set(properties)
+				self.sideEffects.put(("set", "discord/properties/guilds/{}".format(guildId), properties))
 				return True
 
 		except:
@@ -264,11 +637,15 @@ if __name__ == "__main__":
 	databaseHandler = DatabaseHandler()
 	print("[Startup]: Database handler is ready")
 
-	processingThreads = []
-	for i in range(3):
-		p = Thread(target=databaseHandler.run)
-		p.start()
-		processingThreads.append(p)
+	replicaCount = int(environ.get("DATABASE_REPLICAS", "0"))
+	if replicaCount > 0:
+		databaseHandler.start_replicas(replicaCount)
+	else:
+		processingThreads = []
+		for i in range(3):
+			p = Thread(target=databaseHandler.run)
+			p.start()
+			processingThreads.append(p)
 
 	print("[Startup]: Database handler is online")
 	databaseHandler.queue()
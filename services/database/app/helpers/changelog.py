@@ -0,0 +1,38 @@
+from bisect import bisect_left, insort
+
+
+class ChangeLog(object):
+	# Keeps the time of the latest change to every key ordered by time, so recent changes are found without walking all keys
+	def __init__(self):
+		self.changes = []
+		self.latest = {}
+		self.startTime = None
+		self.readTimes = {}
+
+	def record(self, source, keys, readTime):
+		for key in keys:
+			self.latest[key] = readTime
+			insort(self.changes, (readTime, key))
+		if len(self.changes) > 2 * len(self.latest) + 1024:
+			self.changes = sorted((changeTime, key) for key, changeTime in self.latest.items())
+
+		if source not in self.readTimes: self.startTime = readTime if self.startTime is None else max(self.startTime, readTime)
+		self.readTimes[source] = readTime
+
+	def restore(self, readTimes):
+		# Changes from before the restore aren't known, so older versions are answered with everything
+		self.readTimes = readTimes
+		self.startTime = max(readTimes.values())
+
+	def copy(self):
+		changeLog = ChangeLog()
+		changeLog.changes, changeLog.latest, changeLog.startTime, changeLog.readTimes = list(self.changes), dict(self.latest), self.startTime, dict(self.readTimes)
+		return changeLog
+
+	def version(self):
+		# Every change committed before the oldest read time of all sources has been seen
+		return min(self.readTimes.values())
+
+	def since(self, version):
+		if self.startTime is None or version < self.startTime: return None
+		return {self.changes[i][1] for i in range(bisect_left(self.changes, (version,)), len(self.changes))}
@@ -0,0 +1,24 @@
+class Projection(object):
+	# Keeps only the listed fields of a document, nested fields are given as dotted paths
+	def __init__(self, fields):
+		self.fields = {}
+		for field in sorted(fields, key=lambda field: field.count(".")):
+			node, *path = self.fields, *field.split(".")
+			for key in path[:-1]:
+				if key in node and node[key] is None: break
+				node = node.setdefault(key, {})
+			else:
+				node[path[-1]] = None
+
+	def apply(self, document):
+		return Projection.select(document, self.fields)
+
+	@staticmethod
+	def select(document, fields):
+		# Fields that exist in the document are always kept, even if none of their projected children do
+		projected = {}
+		for key, children in fields.items():
+			if key not in document: continue
+			value = document[key]
+			projected[key] = value if children is None or not isinstance(value, dict) else Projection.select(value, children)
+		return projected
@@ -147,7 +147,7 @@ class PaperTraderServer(object):
 					else:
 						raise Exception("time out")
 
-				accountProperties = self.accountProperties.get(accountId)
+				accountProperties = self.accountProperties.get(accountId, cached=False)
 
 				for candle in reversed(payload["candles"]):
 					if candle[0] < order["timestamp"] / 1000: break
@@ -0,0 +1,33 @@
+from sys import intern
+
+
+class Market(object):
+	__slots__ = ["id", "base", "quote", "active", "pricePrecision", "amountPrecision", "isTokenizedStock"]
+
+	def __init__(self, id, base, quote, active, pricePrecision, amountPrecision, isTokenizedStock):
+		self.id = id
+		self.base = intern(base)
+		self.quote = intern(quote)
+		self.active = active
+		self.pricePrecision = pricePrecision
+		self.amountPrecision = amountPrecision
+		self.isTokenizedStock = isTokenizedStock
+
+	@staticmethod
+	def from_ccxt(exchangeId, market):
+		info = market["info"] if isinstance(market.get("info"), dict) else {}
+		ftxTokenizedStock = exchangeId == "ftx" and bool(info.get("tokenizedEquity", False))
+		bittrexTokenizedStock = exchangeId == "bittrex" and "TOKENIZED_SECURITY" in info.get("tags", [])
+		precision = market.get("precision", {})
+		return Market(market["id"], market["base"], market["quote"], market.get("active"), precision.get("price", 8), precision.get("amount", 8), ftxTokenizedStock or bittrexTokenizedStock)
+
+	@staticmethod
+	def to_columns(markets):
+		columns = {"symbol": list(markets)}
+		for key in Market.__slots__:
+			columns[key] = [getattr(market, key) for market in markets.values()]
+		return columns
+
+	@staticmethod
+	def from_columns(columns):
+		return {intern(symbol): Market(*values) for symbol, *values in zip(columns["symbol"], *[columns[key] for key in Market.__slots__])}
@@ -0,0 +1,48 @@
+from collections import deque
+
+
+class PatternMatcher(object):
+	# Aho-Corasick automaton, every state keeps the highest priority pattern ending in it or in any of its suffixes
+	def __init__(self, patterns):
+		self.transitions = [{}]
+		self.outputs = [None]
+		self.patterns = []
+
+		for pattern in patterns:
+			priority = len(self.patterns)
+			self.patterns.append(pattern)
+			state = 0
+			for character in pattern:
+				if character not in self.transitions[state]:
+					self.transitions.append({})
+					self.outputs.append(None)
+					self.transitions[state][character] = len(self.transitions) - 1
+				state = self.transitions[state][character]
+			if self.outputs[state] is None: self.outputs[state] = priority
+
+		self.failures = [0] * len(self.transitions)
+		queue = deque(self.transitions[0].values())
+		while queue:
+			state = queue.popleft()
+			for character, nextState in self.transitions[state].items():
+				failure = self.failures[state]
+				while failure != 0 and character not in self.transitions[failure]:
+					failure = self.failures[failure]
+				self.failures[nextState] = self.transitions[failure].get(character, 0)
+				fallback = self.outputs[self.failures[nextState]]
+				if fallback is not None and (self.outputs[nextState] is None or fallback < self.outputs[nextState]):
+					self.outputs[nextState] = fallback
+				queue.append(nextState)
+
+	def find(self, text):
+		best = self.outputs[0]
+		state = 0
+		for character in text:
+			while state != 0 and character not in self.transitions[state]:
+				state = self.failures[state]
+			state = self.transitions[state].get(character, 0)
+			output = self.outputs[state]
+			if output is not None and (best is None or output < best):
+				best = output
+				if best == 0: break
+		return None if best is None else self.patterns[best]
@@ -1,4 +1,3 @@
-from math import ceil
 from time import time
 
 
@@ -8,11 +7,48 @@ class Utils(object):
 		symbolInfo = exchange.properties.markets[symbol]
 		marketPair = symbol.replace("-", "").split("/")
 		marketName1 = "".join(marketPair)
-		marketName2 = symbolInfo["id"].replace("_", "").replace("/", "").replace("-", "").upper()
+		marketName2 = symbolInfo.id.replace("_", "").replace("/", "").replace("-", "").upper()
 
 		if any(e in marketName2 for e in ["XBT"]) or exchange.id in ["bitmex"]: return marketName2
 		else: return marketName1
 
+	@staticmethod
+	def generate_ccxt_market_index(exchange):
+		# Sorted ids of all active markets, so the ids starting with a ticker are found with a binary search. Each id points to the
+		# position of its symbol, flags tell whether it's the exact pair (1), the market id whose prefixes also match (2), and whether
+		# it belongs to the reversed pair (4)
+		entries = {}
+		if exchange.properties is None or exchange.properties.symbols is None: return {"keys": [], "positions": [], "flags": []}
+
+		for position, symbol in enumerate(exchange.properties.symbols):
+			if not exchange.properties.markets[symbol].active: continue
+			marketPair = symbol.split("/")
+			marketId = Utils.generate_market_id(symbol, exchange)
+			for isReversed in (0, 4):
+				exactId = marketPair[0] if len(marketPair) == 1 else marketPair[0] + marketPair[1]
+				entries[(exactId, position, isReversed)] = entries.get((exactId, position, isReversed), isReversed) | 1
+				entries[(marketId, position, isReversed)] = entries.get((marketId, position, isReversed), isReversed) | 2
+				marketPair.reverse()
+				marketId = "".join(marketPair)
+
+		orderedEntries = sorted(entries)
+		return {
+			"keys": [key for key, _, _ in orderedEntries],
+			"positions": [position for _, position, _ in orderedEntries],
+			"flags": [entries[entry] for entry in orderedEntries]
+		}
+
+
+	@staticmethod
+	def generate_prefix_index(keys):
+		prefixIndex = {}
+		for key in keys:
+			for i in range(len(key) + 1):
+				prefix = key[:i]
+				if prefix not in prefixIndex: prefixIndex[prefix] = []
+				prefixIndex[prefix].append(key)
+		return prefixIndex
+
 	@staticmethod
 	def seconds_until_cycle():
 		return (time() + 60) // 60 * 60 - time()
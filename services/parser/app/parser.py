@@ -1,15 +1,22 @@
-from os import environ
+from os import environ, path, makedirs, replace
 from sys import maxsize as MAXSIZE
 from signal import signal, SIGINT, SIGTERM
-from time import sleep
+from time import time, sleep
 from datetime import datetime
 from pytz import utc
-from zmq import Context, Poller, ROUTER, REQ, LINGER, POLLIN
+from zmq import Context, Poller, device, ROUTER, DEALER, QUEUE, REQ, LINGER, POLLIN
 from lark import Lark, Token, Transformer
 from lark.reconstruct import Reconstructor
 from orjson import dumps, loads
 from traceback import format_exc
-from threading import Thread
+from threading import Thread, Lock
+from multiprocessing import get_context
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile
+from hashlib import sha1
+from collections import OrderedDict
+from bisect import bisect_left
+from copy import copy, deepcopy
 from requests import get
 
 import ccxt
@@ -21,6 +28,8 @@ from TickerParser import Exchange
 
 from assets import static_storage
 from helpers.utils import Utils
+from helpers.market import Market
+from helpers.matcher import PatternMatcher
 from helpers import supported
 
 
@@ -57,19 +66,52 @@ TICKER_OVERRIDES = {
 	]
 }
 
+EXCHANGE_SHORTCUTS = {
+	"crypto": {
+		"binance": ["bin", "bi", "b"],
+		"bitmex": ["bmx", "mex", "btmx", "bx"],
+		"binanceusdm": ["binancefutures", "binancef", "fbin", "binf", "bif", "bf", "bnf"],
+		"coinbasepro": ["cbp", "coin", "base", "cb", "coinbase", "coinbasepro", "cbpro"],
+		"bitfinex2": ["bfx", "finex", "bf"],
+		"bittrex": ["btrx", "brx"],
+		"poloniex": ["po", "polo"],
+		"kraken": ["k", "kra"],
+		"gemini": ["ge", "gem"]
+	},
+	"traditional": {}
+}
+
+TICKER_CACHE_SIZE = 4096
+
+SNAPSHOT_DIRECTORY = "snapshots/v2"
+
+MARKET_LOAD_WORKERS = 16
+MARKET_LOAD_TIMEOUT = 15000
 
 class TickerParserServer(object):
 	coinGecko = CoinGeckoAPI()
 
 	exchanges = {}
+	ccxtExchanges = {}
+	iexcExchanges = {}
 	ccxtIndex = {}
+	ccxtMarketIndex = {}
+	ccxtListingsIndex = {}
 	serumIndex = {}
+	serumIndexOrder = {}
+	serumPrefixIndex = {}
 	coinGeckoIndex = {}
+	coinGeckoIndexOrder = {}
+	coinGeckoPrefixIndex = {}
 	iexcStocksIndex = {}
 	iexcForexIndex = {}
+	iexcExchangeIdIndex = {}
+	iexcIdIndex = {}
+	marketLoadTimes = {}
 
-	coingeckoVsCurrencies = []
-	coingeckoFiatCurrencies = []
+	coingeckoVsCurrencies = set()
+	coingeckoFiatCurrencies = set()
+	fiatMatcher = PatternMatcher([])
 
 	def __init__(self):
 		self.isServiceAvailable = True
@@ -80,65 +122,114 @@ class TickerParserServer(object):
 
 		self.context = Context.instance()
 
-		self.refresh_coingecko_index()
-		processes = [
-			Thread(target=self.refresh_coingecko_exchange_rates),
-			Thread(target=self.refresh_ccxt_index),
-			Thread(target=self.refresh_serum_index),
-			Thread(target=self.refresh_iexc_index)
-		]
-		for p in processes: p.start()
-		for p in processes: p.join()
+		self.processContext = get_context("spawn")
+		self.exchangeTemplates = {}
 
-		self.jobQueue = Thread(target=self.job_queue)
-		self.jobQueue.start()
+		self.indexLock = Lock()
+		self.generationId = 0
+		self.generationCycle = 0
+		self.buildDuration = 0
+		self.payloadDigests = {}
+		self.index = TickerIndex(self)
 
-		self.socket = self.context.socket(ROUTER)
-		self.socket.bind("tcp://*:6900")
+		# A snapshot left by a previous run is served right away while fresh indexes are built in the background
+		if self.load_snapshot(): Thread(target=self.refresh_indexes).start()
+		else: self.refresh_indexes()
 
-		print("[Startup]: Ticker Parser is online")
+		self.jobQueue = Thread(target=self.job_queue)
+		self.jobQueue.start()
 
 	def exit_gracefully(self):
 		print("[Startup]: Ticker Parser is exiting")
-		self.socket.close()
 		self.isServiceAvailable = False
 
+	def queue(self):
+		try:
+			frontend = self.context.socket(ROUTER)
+			frontend.bind("tcp://*:6900")
+			backend = self.context.socket(DEALER)
+			backend.bind("inproc://parser-workers")
+
+			device(QUEUE, frontend, backend)
+		except Exception:
+			print(format_exc())
+			if environ["PRODUCTION_MODE"]: self.logging.report_exception()
+		finally:
+			frontend.close()
+			backend.close()
+
 	def run(self):
+		socket = self.context.socket(ROUTER)
+		socket.connect("inproc://parser-workers")
+
 		while self.isServiceAvailable:
 			try:
-				response = []
-				message = self.socket.recv_multipart()
-				if len(message) < 4: continue
-				origin, delimeter, service = message[:3]
-				request = message[3:]
+				envelope, response, index = None, [], self.index
+				message = socket.recv_multipart()
+				# Frames up to the first empty one are routing frames, DEALER clients add their request id to them
+				if b"" not in message[:-1]: continue
+				split = message.index(b"") + 1
+				envelope, service, request = message[:split], message[split], message[split + 1:]
+
+				# Every request is served from the index that was active when it arrived
+				index = self.index
 
 				if service == b"find_exchange":
 					[raw, platform, bias] = request
-					response = self.find_exchange(raw.decode(), platform.decode(), bias.decode())
+					response = index.find_exchange(raw.decode(), platform.decode(), bias.decode())
 				elif service == b"match_ticker":
 					[tickerId, exchangeId, platform, bias] = request
-					response = self.match_ticker(tickerId.decode(), exchangeId.decode(), platform.decode(), bias.decode())
+					response = index.match_ticker(tickerId.decode(), exchangeId.decode(), platform.decode(), bias.decode())
+				elif service == b"match_ticker_batch":
+					for i in range(0, len(request), 4):
+						[tickerId, exchangeId, platform, bias] = request[i:i + 4]
+						try:
+							response += index.match_ticker(tickerId.decode(), exchangeId.decode(), platform.decode(), bias.decode())
+						except Exception:
+							# A failing query must not shift the results of the ones that follow it
+							print(format_exc())
+							if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=f"{request[i:i + 4]}")
+							response += [b"", b""]
 				elif service == b"check_if_fiat":
 					[tickerId] = request
-					response = self.check_if_fiat(tickerId.decode())
+					response = index.check_if_fiat(tickerId.decode())
 				elif service == b"get_listings":
 					[tickerBase, tickerQuote] = request
-					response = self.get_listings(tickerBase.decode(), tickerQuote.decode())
+					response = index.get_listings(tickerBase.decode(), tickerQuote.decode())
+				elif service == b"get_precision_table":
+					[exchangeId] = request
+					response = index.get_precision_table(exchangeId.decode())
+				elif service == b"get_formatted_ccxt_batch":
+					for i in range(0, len(request), 4):
+						[kind, exchangeId, symbol, value] = request[i:i + 4]
+						formatter = index.format_price if kind == b"price" else index.format_amount
+						try:
+							response += formatter(exchangeId.decode(), symbol.decode(), value.decode())
+						except Exception:
+							print(format_exc())
+							if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=f"{request[i:i + 4]}")
+							response += [b""]
 				elif service == b"get_formatted_price_ccxt":
 					[exchangeId, symbol, price] = request
-					response = self.format_price(exchangeId.decode(), symbol.decode(), price.decode())
+					response = index.format_price(exchangeId.decode(), symbol.decode(), price.decode())
 				elif service == b"get_formatted_amount_ccxt":
 					[exchangeId, symbol, amount] = request
-					response = self.format_amount(exchangeId.decode(), symbol.decode(), amount.decode())
+					response = index.format_amount(exchangeId.decode(), symbol.decode(), amount.decode())
+				elif service == b"get_generation":
+					response = [str(index.generationId).encode(), str(index.buildDuration).encode()]
 
 			except (KeyboardInterrupt, SystemExit): return
 			except Exception:
 				print(format_exc())
 				if environ["PRODUCTION_MODE"]: self.logging.report_exception(user=f"{request}")
 			finally:
-				try: self.socket.send_multipart([origin, delimeter] + response)
+				try:
+					# Every reply carries the refresh cycle of the index that served it, clients drop lookups cached from older ones
+					if envelope is not None: socket.send_multipart(envelope + [str(index.generationCycle).encode()] + response)
 				except: pass
 
+		socket.close()
+
 	def job_queue(self):
 		while True:
 			try:
@@ -146,19 +237,148 @@ class TickerParserServer(object):
 				t = datetime.now().astimezone(utc)
 				timeframes = Utils.get_accepted_timeframes(t)
 
+				start, generation = time(), {}
 				if "1H" in timeframes:
-					self.refresh_ccxt_index()
-					self.refresh_coingecko_index()
-					self.refresh_serum_index()
-					self.refresh_coingecko_exchange_rates()
+					generation.update(self.refresh_ccxt_index(self.coinGeckoIndex))
+					generation.update(self.refresh_coingecko_index())
+					generation.update(self.refresh_serum_index())
+					generation.update(self.refresh_coingecko_exchange_rates())
 				if "1D" in timeframes:
-					self.refresh_iexc_index()
+					generation.update(self.refresh_iexc_index())
+				if len(generation) != 0: self.publish(generation, int(t.timestamp()), time() - start)
 
 			except Exception:
 				print(format_exc())
 				if environ["PRODUCTION_MODE"]: self.logging.report_exception()
 
-	def refresh_ccxt_index(self):
+	def refresh_indexes(self):
+		# Builds outside of the job queue belong to the hourly cycle the other replicas last refreshed in
+		start = time()
+		generation = self.refresh_coingecko_index()
+		coinGeckoIndex = generation.get("coinGeckoIndex", self.coinGeckoIndex)
+		with ThreadPoolExecutor(max_workers=4) as pool:
+			builds = [
+				pool.submit(self.refresh_coingecko_exchange_rates),
+				pool.submit(self.refresh_ccxt_index, coinGeckoIndex),
+				pool.submit(self.refresh_serum_index),
+				pool.submit(self.refresh_iexc_index)
+			]
+		for build in builds: generation.update(build.result())
+		if len(generation) != 0: self.publish(generation, int(start // 3600 * 3600), time() - start)
+
+	def load_snapshot(self):
+		start = time()
+		builders = [TickerParserServer.build_coingecko_index, TickerParserServer.build_coingecko_exchange_rates, TickerParserServer.build_ccxt_index, TickerParserServer.build_serum_index, TickerParserServer.build_iexc_index]
+		generation = {}
+		try:
+			for builder in builders:
+				generation.update(TickerParserServer.read_snapshot(builder))
+		except FileNotFoundError:
+			return False
+		except Exception:
+			print(format_exc())
+			return False
+		# Snapshot data may be hours old, clients don't cache it once they've seen a generation from any refresh cycle
+		self.publish(generation, 0, time() - start)
+		print("[Startup]: Ticker Parser loaded index snapshot in {:.3f} seconds".format(self.buildDuration))
+		return True
+
+	@staticmethod
+	def read_snapshot(builder):
+		with open(path.join(SNAPSHOT_DIRECTORY, builder.__name__), "rb") as snapshot:
+			return loads(snapshot.read())
+
+	def save_snapshot(self, builder, payload):
+		try:
+			makedirs(SNAPSHOT_DIRECTORY, exist_ok=True)
+			# Replicas on the same node share the directory, each one writes to its own file before swapping it in
+			with NamedTemporaryFile(dir=SNAPSHOT_DIRECTORY, delete=False) as snapshot:
+				snapshot.write(payload)
+			replace(snapshot.name, path.join(SNAPSHOT_DIRECTORY, builder.__name__))
+		except Exception:
+			print(format_exc())
+
+	def refresh(self, builder, *args):
+		# Indexes are built in a separate process and only the finished generation is shipped back, the caller publishes
+		# the generations of a whole refresh cycle at once
+		receiver, sender = self.processContext.Pipe(duplex=False)
+		process = self.processContext.Process(target=TickerParserServer.build_generation, args=(sender, builder, args))
+		process.start()
+		sender.close()
+		try:
+			payload = receiver.recv_bytes()
+		except EOFError:
+			print("Index build {} failed, keeping generation {}".format(builder.__name__, self.generationId))
+			return {}
+		finally:
+			receiver.close()
+			process.join()
+		# Builds that came back unchanged are dropped, so the index and its generation only move when the data does
+		digest = sha1(payload).digest()
+		if self.payloadDigests.get(builder.__name__) == digest: return {}
+		self.payloadDigests[builder.__name__] = digest
+		self.save_snapshot(builder, payload)
+		return loads(payload)
+
+	@staticmethod
+	def build_generation(connection, builder, args):
+		try:
+			connection.send_bytes(dumps(builder(*args)))
+		except Exception:
+			print(format_exc())
+		finally:
+			connection.close()
+
+	def publish(self, generation, cycle, buildDuration):
+		# Publishes are serialized, the startup refresh can overlap with the job queue and both share the exchange templates
+		with self.indexLock:
+			for key in ["ccxtExchanges", "iexcExchanges"]:
+				if key in generation: generation[key] = self._restore_exchanges(generation[key])
+			if "coingeckoVsCurrencies" in generation: generation["coingeckoVsCurrencies"] = set(generation["coingeckoVsCurrencies"])
+			if "coingeckoFiatCurrencies" in generation:
+				# The fiat list keeps its order so that the matcher reports the same currency as a sequential scan would
+				generation["fiatMatcher"] = PatternMatcher(generation["coingeckoFiatCurrencies"])
+				generation["coingeckoFiatCurrencies"] = set(generation["coingeckoFiatCurrencies"])
+
+			for key, value in generation.items():
+				setattr(self, key, value)
+			self.exchanges = {**self.ccxtExchanges, **self.iexcExchanges}
+			self.generationId += 1
+			# Replicas number their generations independently, the refresh cycle is the same on every replica that built its data in it
+			self.generationCycle = max(self.generationCycle, cycle)
+			self.buildDuration = buildDuration
+			self.index = TickerIndex(self)
+
+	def _restore_exchanges(self, records):
+		exchanges = {}
+		for exchangeId, record in records.items():
+			if record["exchange"]["type"] == "crypto":
+				# CCXT instances are only created once, every generation gets a shallow copy carrying its own markets
+				if exchangeId not in self.exchangeTemplates: self.exchangeTemplates[exchangeId] = Exchange.from_dict(record["exchange"])
+				exchange = copy(self.exchangeTemplates[exchangeId])
+				exchange.properties = copy(exchange.properties)
+				exchange.properties.symbols = record["symbols"]
+			else:
+				exchange = Exchange.from_dict(record["exchange"])
+				exchange.properties.symbols = None if record["symbols"] is None else set(record["symbols"])
+			exchange.properties.markets = None if record["markets"] is None else Market.from_columns(record["markets"])
+			exchanges[exchangeId] = exchange
+		return exchanges
+
+	@staticmethod
+	def _serialize_exchanges(exchanges):
+		records = {}
+		for exchangeId, exchange in exchanges.items():
+			markets, symbols = exchange.properties.markets, exchange.properties.symbols
+			records[exchangeId] = {"exchange": exchange.to_dict(), "markets": None if markets is None else Market.to_columns(markets), "symbols": None if symbols is None else list(symbols)}
+		return records
+
+	def refresh_ccxt_index(self, coinGeckoIndex):
+		marketCapRanks = {symbol: market["market_cap_rank"] for symbol, market in coinGeckoIndex.items() if market["market_cap_rank"] is not None}
+		return self.refresh(TickerParserServer.build_ccxt_index, marketCapRanks)
+
+	@staticmethod
+	def build_ccxt_index(marketCapRanks):
 		difference = set(ccxt.exchanges).symmetric_difference(supported.ccxtExchanges)
 		newExchanges = []
 		newSupportedExchanges = []
@@ -176,319 +396,429 @@ class TickerParserServer(object):
 		if len(newExchanges) != 0: print("New partially unsupported CCXT exchanges: {}".format(newExchanges))
 		if len(unsupportedCryptoExchanges) != 0: print("New deprecated CCXT exchanges: {}".format(unsupportedCryptoExchanges))
 
-		completedTasks = set()
+		exchanges = {}
+		for platform in supported.cryptoExchanges:
+			for exchange in supported.cryptoExchanges[platform]:
+				if exchange not in exchanges:
+					exchanges[exchange] = Exchange(exchange, "crypto" if exchange in ccxt.exchanges else "traditional")
+
+		completedTasks, marketLoadTimes = TickerParserServer._load_ccxt_markets(exchanges)
 		sortedIndexReference = {}
 
 		for platform in supported.cryptoExchanges:
 			if platform not in sortedIndexReference: sortedIndexReference[platform] = {}
 			for exchange in supported.cryptoExchanges[platform]:
-				if exchange not in completedTasks:
-					if exchange not in self.exchanges: self.exchanges[exchange] = Exchange(exchange, "crypto" if exchange in ccxt.exchanges else "traditional")
-					try: self.exchanges[exchange].properties.load_markets()
-					except: continue
-					completedTasks.add(exchange)
-
-				for symbol in self.exchanges[exchange].properties.symbols:
-					if '.' not in symbol and (self.exchanges[exchange].properties.markets[symbol].get("active") is None or self.exchanges[exchange].properties.markets[symbol].get("active")):
-						base = self.exchanges[exchange].properties.markets[symbol]["base"]
-						quote = self.exchanges[exchange].properties.markets[symbol]["quote"]
+				if exchange not in completedTasks: continue
+
+				for symbol in exchanges[exchange].properties.symbols:
+					market = exchanges[exchange].properties.markets[symbol]
+					if '.' not in symbol and (market.active is None or market.active):
+						base = market.base
+						quote = market.quote
 						marketPair = symbol.split("/")
 
 						if base != marketPair[0] or quote != marketPair[-1]:
 							if marketPair[0] != marketPair[-1]: base, quote = marketPair[0], marketPair[-1]
 							else: continue
 
-						isIdentifiable = quote in self.coinGeckoIndex and self.coinGeckoIndex[quote]["market_cap_rank"] is not None
-
 						if base not in sortedIndexReference[platform]:
 							sortedIndexReference[platform][base] = {}
 						if quote not in sortedIndexReference[platform][base]:
-							if isIdentifiable:
-								sortedIndexReference[platform][base][quote] = self.coinGeckoIndex[quote]["market_cap_rank"]
-							else:
-								sortedIndexReference[platform][base][quote] = MAXSIZE
+							sortedIndexReference[platform][base][quote] = marketCapRanks.get(quote, MAXSIZE)
 
+		ccxtIndex = {}
 		for platform in sortedIndexReference:
-			self.ccxtIndex[platform] = {}
+			ccxtIndex[platform] = {}
 			for base in sortedIndexReference[platform]:
-				if base not in self.ccxtIndex[platform]: self.ccxtIndex[platform][base] = []
-				self.ccxtIndex[platform][base] = sorted(sortedIndexReference[platform][base].keys(), key=lambda quote: sortedIndexReference[platform][base][quote])
-				try: self.ccxtIndex[platform][base].insert(0, self.ccxtIndex[platform][base].pop(self.ccxtIndex[platform][base].index("USDT")))
+				ccxtIndex[platform][base] = sorted(sortedIndexReference[platform][base].keys(), key=lambda quote: sortedIndexReference[platform][base][quote])
+				try: ccxtIndex[platform][base].insert(0, ccxtIndex[platform][base].pop(ccxtIndex[platform][base].index("USDT")))
 				except: pass
-				try: self.ccxtIndex[platform][base].insert(0, self.ccxtIndex[platform][base].pop(self.ccxtIndex[platform][base].index("USD")))
+				try: ccxtIndex[platform][base].insert(0, ccxtIndex[platform][base].pop(ccxtIndex[platform][base].index("USD")))
 				except: pass
 
-	def refresh_serum_index(self):
-		try:
-			rawData = []
-			for i in range(3):
-				socket = self.context.socket(REQ)
-				socket.connect("tcp://serum-server:6900")
-				socket.setsockopt(LINGER, 0)
-				poller = Poller()
-				poller.register(socket, POLLIN)
-
-				socket.send(dumps({"endpoint": "list"}))
-				responses = poller.poll(10000)
-
-				if len(responses) != 0:
-					response = socket.recv()
-					socket.close()
-					rawData = loads(response)
-					break
-				else:
-					socket.close()
-
-			for market in rawData["markets"]:
-				base, quote = market["name"].split("/", 1)
-				if base not in self.serumIndex:
-					self.serumIndex[base] = []
-				self.serumIndex[base].append({"id": market["address"], "name": base, "base": base, "quote": quote, "image": None, "program": market["programId"]})
-
-			for token in rawData["tokenList"]:
-				symbol = token["symbol"].upper()
-				if symbol not in self.serumIndex:
-					self.serumIndex[symbol] = []
-				processed = []
-				for market in self.serumIndex[symbol]:
-					processed.append(market["quote"])
-					market["name"] = token["name"]
-					market["image"] = token.get("logoURI")
-				for extension, address in token.get("extensions", {}).items():
-					if extension.startswith("serumV3"):
-						quote = extension.removeprefix("serumV3").upper()
-						if quote not in processed:
-							processed.append(quote)
-							self.serumIndex[symbol].append({"id": address, "name": token["name"], "base": symbol, "quote": quote, "image": token.get("logoURI"), "program": "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"})
-				if len(self.serumIndex[symbol]) == 0:
-					self.serumIndex.pop(symbol)
-				elif self.serumIndex[symbol][0]["quote"] != "USDC":
-					usdcMarket = None
-					for index, market in enumerate(self.serumIndex[symbol]):
-						if market["quote"] == "USDC":
-							usdcMarket = self.serumIndex[symbol].pop(index)
-							break
-					if usdcMarket is not None:
-						self.serumIndex[symbol].insert(0, usdcMarket)
+		ccxtMarketIndex = {exchange: Utils.generate_ccxt_market_index(exchanges[exchange]) for exchange in exchanges if exchanges[exchange].type == "crypto"}
 
-		except Exception:
-			print(format_exc())
+		return {
+			"ccxtExchanges": TickerParserServer._serialize_exchanges(exchanges),
+			"ccxtIndex": ccxtIndex,
+			"ccxtMarketIndex": ccxtMarketIndex,
+			"ccxtListingsIndex": TickerParserServer._build_ccxt_listings_index(exchanges, ccxtIndex),
+			"marketLoadTimes": marketLoadTimes
+		}
+
+	@staticmethod
+	def _load_ccxt_markets(exchanges):
+		def load_markets(exchange):
+			start = time()
+			fetch = exchange.properties.fetch
+			def fetch_before_deadline(*args, **kwargs):
+				# Loading markets can take several requests, all of them share the timeout of the exchange
+				remaining = int((start - time()) * 1000) + MARKET_LOAD_TIMEOUT
+				if remaining <= 0: raise ccxt.RequestTimeout("{} markets did not load in {} ms".format(exchange.id, MARKET_LOAD_TIMEOUT))
+				exchange.properties.timeout = remaining
+				return fetch(*args, **kwargs)
+			exchange.properties.fetch = fetch_before_deadline
+			try: exchange.properties.load_markets()
+			finally: del exchange.properties.fetch
+			# Only the fields used by the index are kept, raw ccxt market data is released right away
+			exchange.properties.markets = {symbol: Market.from_ccxt(exchange.id, market) for symbol, market in exchange.properties.markets.items()}
+			exchange.properties.markets_by_id = None
+			return time() - start
+
+		try: previousExchanges = TickerParserServer.read_snapshot(TickerParserServer.build_ccxt_index).get("ccxtExchanges", {})
+		except FileNotFoundError: previousExchanges = {}
+
+		with ThreadPoolExecutor(max_workers=MARKET_LOAD_WORKERS) as pool:
+			tasks = {exchangeId: pool.submit(load_markets, exchange) for exchangeId, exchange in exchanges.items() if exchange.type == "crypto"}
+
+		completedTasks, marketLoadTimes = set(), {}
+		for exchangeId, task in tasks.items():
+			try:
+				marketLoadTimes[exchangeId] = task.result()
+				completedTasks.add(exchangeId)
+			except Exception as e:
+				# Exchanges that failed to load keep serving the markets from the last published generation
+				previous = previousExchanges.get(exchangeId, {})
+				print("Failed to load {} markets, {}: {}".format(exchangeId, "keeping previous markets" if previous.get("markets") is not None else "dropping", e))
+				if previous.get("markets") is None: continue
+				exchanges[exchangeId].properties.markets = Market.from_columns(previous["markets"])
+				exchanges[exchangeId].properties.symbols = previous["symbols"]
+				completedTasks.add(exchangeId)
+
+		slowestExchanges = sorted(marketLoadTimes, key=lambda exchangeId: marketLoadTimes[exchangeId], reverse=True)[:5]
+		print("Loaded markets of {} CCXT exchanges, slowest: {}".format(len(marketLoadTimes), ", ".join("{} ({:.1f}s)".format(exchangeId, marketLoadTimes[exchangeId]) for exchangeId in slowestExchanges)))
+		return completedTasks, marketLoadTimes
+
+	@staticmethod
+	def _build_ccxt_listings_index(exchanges, ccxtIndex):
+		listings = {}
+		for exchangeId in supported.cryptoExchanges["CCXT"]:
+			exchange = exchanges[exchangeId]
+			if exchange.properties is None or exchange.properties.symbols is None: continue
+			for symbol in exchange.properties.symbols:
+				base = exchange.properties.markets[symbol].base
+				quote = exchange.properties.markets[symbol].quote
+				if base not in listings: listings[base] = {}
+				if quote not in listings[base]: listings[base][quote] = {}
+				listings[base][quote][exchange.name] = None
+
+		listingsIndex = {}
+		for base in listings:
+			quotes = {quote: list(names) for quote, names in listings[base].items()}
+			rankedQuotes = [quote for quote in ccxtIndex["CCXT"].get(base, []) if quote in quotes]
+			total = sum(len(names) for names in quotes.values())
+			listingsIndex[base] = (quotes, rankedQuotes, total)
+		return listingsIndex
+
+	def refresh_serum_index(self):
+		return self.refresh(TickerParserServer.build_serum_index)
+
+	@staticmethod
+	def build_serum_index():
+		rawData = []
+		serumIndex = {}
+		for i in range(3):
+			socket = Context.instance().socket(REQ)
+			socket.connect("tcp://serum-server:6900")
+			socket.setsockopt(LINGER, 0)
+			poller = Poller()
+			poller.register(socket, POLLIN)
+
+			socket.send(dumps({"endpoint": "list"}))
+			responses = poller.poll(10000)
+
+			if len(responses) != 0:
+				response = socket.recv()
+				socket.close()
+				rawData = loads(response)
+				break
+			else:
+				socket.close()
+
+		for market in rawData["markets"]:
+			base, quote = market["name"].split("/", 1)
+			if base not in serumIndex:
+				serumIndex[base] = []
+			serumIndex[base].append({"id": market["address"], "name": base, "base": base, "quote": quote, "image": None, "program": market["programId"]})
+
+		for token in rawData["tokenList"]:
+			symbol = token["symbol"].upper()
+			if symbol not in serumIndex:
+				serumIndex[symbol] = []
+			processed = []
+			for market in serumIndex[symbol]:
+				processed.append(market["quote"])
+				market["name"] = token["name"]
+				market["image"] = token.get("logoURI")
+			for extension, address in token.get("extensions", {}).items():
+				if extension.startswith("serumV3"):
+					quote = extension.removeprefix("serumV3").upper()
+					if quote not in processed:
+						processed.append(quote)
+						serumIndex[symbol].append({"id": address, "name": token["name"], "base": symbol, "quote": quote, "image": token.get("logoURI"), "program": "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"})
+			if len(serumIndex[symbol]) == 0:
+				serumIndex.pop(symbol)
+			elif serumIndex[symbol][0]["quote"] != "USDC":
+				usdcMarket = None
+				for index, market in enumerate(serumIndex[symbol]):
+					if market["quote"] == "USDC":
+						usdcMarket = serumIndex[symbol].pop(index)
+						break
+				if usdcMarket is not None:
+					serumIndex[symbol].insert(0, usdcMarket)
+
+		return {
+			"serumIndex": serumIndex,
+			"serumIndexOrder": {symbol: i for i, symbol in enumerate(serumIndex)},
+			"serumPrefixIndex": Utils.generate_prefix_index(serumIndex)
+		}
 
 	def refresh_coingecko_index(self):
-		try:
-			blacklist = ["UNIUSD", "AAPL", "TSLA", "ETHUSDADL4"]
-			rawData = []
-			indexReference, page = {}, 1
+		return self.refresh(TickerParserServer.build_coingecko_index)
+
+	@staticmethod
+	def build_coingecko_index():
+		blacklist = ["UNIUSD", "AAPL", "TSLA", "ETHUSDADL4"]
+		rawData = []
+		indexReference, page = {}, 1
+		while True:
+			try:
+				response = TickerParserServer.coinGecko.get_coins_markets(vs_currency="usd", order="id_asc", per_page=250, page=page)
+				sleep(0.6)
+			except:
+				print(format_exc())
+				sleep(10)
+				continue
+
+			if len(response) == 0: break
+			rawData += response
+			page += 1
+
+		rawData.sort(reverse=True, key=lambda k: (float('-inf') if k["market_cap_rank"] is None else -k["market_cap_rank"], 0 if k["total_volume"] is None else k["total_volume"], k["name"], k["id"]))
+		for e in rawData:
+			symbol = e["symbol"].upper()
+			if symbol in blacklist: continue
+			if symbol not in indexReference:
+				rank = MAXSIZE if e["market_cap_rank"] is None else e["market_cap_rank"]
+				indexReference[symbol] = {"id": e["id"], "name": e["name"], "base": symbol, "quote": "USD", "image": e["image"], "market_cap_rank": rank}
+			elif indexReference[symbol]["id"] != e["id"]:
+				for i in range(2, 11):
+					adjustedSymbol = "{}:{}".format(symbol, i)
+					if adjustedSymbol not in indexReference:
+						rank = MAXSIZE if e["market_cap_rank"] is None else e["market_cap_rank"]
+						indexReference[adjustedSymbol] = {"id": e["id"], "name": e["name"], "base": symbol, "quote": "USD", "image": e["image"], "market_cap_rank": rank}
+						break
+
+		return {
+			"coinGeckoIndex": indexReference,
+			"coinGeckoIndexOrder": {symbol: i for i, symbol in enumerate(indexReference)},
+			"coinGeckoPrefixIndex": Utils.generate_prefix_index(indexReference)
+		}
+
+	def refresh_coingecko_exchange_rates(self):
+		return self.refresh(TickerParserServer.build_coingecko_exchange_rates)
+
+	@staticmethod
+	def build_coingecko_exchange_rates():
+		coingeckoVsCurrencies = TickerParserServer.coinGecko.get_supported_vs_currencies()
+		exchangeRates = TickerParserServer.coinGecko.get_exchange_rates()
+		coingeckoFiatCurrencies = []
+		for ticker, value in exchangeRates["rates"].items():
+			if value["type"] == "fiat":
+				coingeckoFiatCurrencies.append(ticker.upper())
+
+		return {
+			"coingeckoVsCurrencies": list({e.upper() for e in coingeckoVsCurrencies}),
+			"coingeckoFiatCurrencies": list(dict.fromkeys(coingeckoFiatCurrencies))
+		}
+
+	def refresh_iexc_index(self):
+		return self.refresh(TickerParserServer.build_iexc_index)
+
+	@staticmethod
+	def build_iexc_index():
+		def get_url(url):
 			while True:
 				try:
-					response = self.coinGecko.get_coins_markets(vs_currency="usd", order="id_asc", per_page=250, page=page)
-					sleep(0.6)
+					return get(url).json()
 				except:
 					print(format_exc())
 					sleep(10)
-					continue
-
-				if len(response) == 0: break
-				rawData += response
-				page += 1
-
-			rawData.sort(reverse=True, key=lambda k: (float('-inf') if k["market_cap_rank"] is None else -k["market_cap_rank"], 0 if k["total_volume"] is None else k["total_volume"], k["name"], k["id"]))
-			for e in rawData:
-				symbol = e["symbol"].upper()
-				if symbol in blacklist: continue
-				if symbol not in indexReference:
-					rank = MAXSIZE if e["market_cap_rank"] is None else e["market_cap_rank"]
-					indexReference[symbol] = {"id": e["id"], "name": e["name"], "base": symbol, "quote": "USD", "image": e["image"], "market_cap_rank": rank}
-				elif indexReference[symbol]["id"] != e["id"]:
-					for i in range(2, 11):
-						adjustedSymbol = "{}:{}".format(symbol, i)
-						if adjustedSymbol not in indexReference:
-							rank = MAXSIZE if e["market_cap_rank"] is None else e["market_cap_rank"]
-							indexReference[adjustedSymbol] = {"id": e["id"], "name": e["name"], "base": symbol, "quote": "USD", "image": e["image"], "market_cap_rank": rank}
-							break
-			self.coinGeckoIndex = indexReference
 
-		except Exception:
-			print(format_exc())
+		iexcExchanges = set()
+		exchanges = {}
+		iexcStocksIndex = {}
+		iexcForexIndex = {}
+		suffixMap = {}
+
+		for exchange in get_url("https://cloud.iexapis.com/stable/ref-data/market/us/exchanges?token={}".format(environ["IEXC_KEY"])):
+			if exchange["refId"] == "": continue
+			exchangeId = exchange["refId"]
+			iexcExchanges.add(exchangeId.lower())
+			exchanges[exchangeId.lower()] = Exchange(exchangeId, "traditional", exchange["longName"], region="us")
+		for exchange in get_url("https://cloud.iexapis.com/stable/ref-data/exchanges?token={}".format(environ["IEXC_KEY"])):
+			exchangeId = exchange["exchange"].replace("Euronext Euronext", "Euronext")
+			if exchangeId.lower() in iexcExchanges: continue
+			iexcExchanges.add(exchangeId.lower())
+			exchanges[exchangeId.lower()] = Exchange(exchangeId, "traditional", exchange["description"], region=exchange["region"])
+			suffixMap[exchangeId.lower()] = exchange["exchangeSuffix"]
+
+		difference = set(iexcExchanges).symmetric_difference(supported.iexcExchanges)
+		newSupportedExchanges = []
+		unsupportedCryptoExchanges = []
+		for exchangeId in difference:
+			if exchangeId not in supported.iexcExchanges:
+				newSupportedExchanges.append(exchangeId)
+			else:
+				unsupportedCryptoExchanges.append(exchangeId)
+		if len(newSupportedExchanges) != 0: print("New supported IEXC exchanges: {}".format(newSupportedExchanges))
+		if len(unsupportedCryptoExchanges) != 0: print("New deprecated IEXC exchanges: {}".format(unsupportedCryptoExchanges))
+
+		iexcExchangeIdIndex, iexcIdIndex = {}, {}
+		for exchangeId in supported.traditionalExchanges["IEXC"]:
+			symbols = get_url("https://cloud.iexapis.com/stable/ref-data/exchange/{}/symbols?token={}".format(exchanges[exchangeId].id, environ["IEXC_KEY"]))
+			if len(symbols) == 0: print("No symbols found on {}".format(exchangeId))
+			iexcExchangeIdIndex[exchangeId] = {}
+			for symbol in symbols:
+				suffix = suffixMap.get(exchangeId, "")
+				tickerId = symbol["symbol"]
+				if tickerId not in iexcStocksIndex:
+					iexcStocksIndex[tickerId] = {"id": tickerId.removesuffix(suffix), "name": symbol["name"], "base": tickerId.removesuffix(suffix), "quote": symbol["currency"]}
+				exchanges[exchangeId].properties.symbols.add(tickerId)
+				iexcExchangeIdIndex[exchangeId][iexcStocksIndex[tickerId]["id"]] = tickerId
+
+			# Raw symbols take precedence over ids within an exchange, the first exchange takes precedence across exchanges
+			if exchanges[exchangeId].type != "traditional": continue
+			exchangeIndex = {**iexcExchangeIdIndex[exchangeId], **{tickerId: tickerId for tickerId in exchanges[exchangeId].properties.symbols}}
+			for tickerId, symbol in exchangeIndex.items():
+				if tickerId not in iexcIdIndex: iexcIdIndex[tickerId] = (exchangeId, symbol)
+
+		forexSymbols = get_url("https://cloud.iexapis.com/stable/ref-data/fx/symbols?token={}".format(environ["IEXC_KEY"]))
+		derivedCurrencies = set()
+		for pair in forexSymbols["pairs"]:
+			derivedCurrencies.add(pair["fromCurrency"])
+			derivedCurrencies.add(pair["toCurrency"])
+			iexcForexIndex[pair["symbol"]] = {"id": pair["symbol"], "name": pair["symbol"], "base": pair["fromCurrency"], "quote": pair["toCurrency"], "reversed": False}
+			iexcForexIndex[pair["toCurrency"] + pair["fromCurrency"]] = {"id": pair["symbol"], "name": pair["toCurrency"] + pair["fromCurrency"], "base": pair["toCurrency"], "quote": pair["fromCurrency"], "reversed": True}
+		for fromCurrency in derivedCurrencies:
+			for toCurrency in derivedCurrencies:
+				symbol = fromCurrency + toCurrency
+				if fromCurrency != toCurrency and symbol not in iexcForexIndex:
+					iexcForexIndex[symbol] = {"id": symbol, "name": symbol, "base": fromCurrency, "quote": toCurrency, "reversed": False}
+
+		return {
+			"iexcExchanges": TickerParserServer._serialize_exchanges(exchanges),
+			"iexcStocksIndex": iexcStocksIndex,
+			"iexcForexIndex": iexcForexIndex,
+			"iexcExchangeIdIndex": iexcExchangeIdIndex,
+			"iexcIdIndex": iexcIdIndex
+		}
 
-	def refresh_coingecko_exchange_rates(self):
-		try:
-			coingeckoVsCurrencies = self.coinGecko.get_supported_vs_currencies()
-			self.coingeckoVsCurrencies = [e.upper() for e in coingeckoVsCurrencies]
-			exchangeRates = self.coinGecko.get_exchange_rates()
-			for ticker, value in exchangeRates["rates"].items():
-				if value["type"] == "fiat":
-					self.coingeckoFiatCurrencies.append(ticker.upper())
-		except Exception:
-			print(format_exc())
 
-	def refresh_iexc_index(self):
-		try:
-			def get_url(url):
-				while True:
-					try:
-						return get(url).json()
-					except:
-						print(format_exc())
-						sleep(10)
-
-
-			iexcExchanges = set()
-			exchanges = get_url("https://cloud.iexapis.com/stable/ref-data/market/us/exchanges?token={}".format(environ["IEXC_KEY"]))
-			suffixMap = {}
-
-			for exchange in exchanges:
-				if exchange["refId"] == "": continue
-				exchangeId = exchange["refId"]
-				iexcExchanges.add(exchangeId.lower())
-				self.exchanges[exchangeId.lower()] = Exchange(exchangeId, "traditional", exchange["longName"], region="us")
-			exchanges = get_url("https://cloud.iexapis.com/stable/ref-data/exchanges?token={}".format(environ["IEXC_KEY"]))
-			for exchange in exchanges:
-				exchangeId = exchange["exchange"].replace("Euronext Euronext", "Euronext")
-				if exchangeId.lower() in iexcExchanges: continue
-				iexcExchanges.add(exchangeId.lower())
-				self.exchanges[exchangeId.lower()] = Exchange(exchangeId, "traditional", exchange["description"], region=exchange["region"])
-				suffixMap[exchangeId.lower()] = exchange["exchangeSuffix"]
-
-			difference = set(iexcExchanges).symmetric_difference(supported.iexcExchanges)
-			newSupportedExchanges = []
-			unsupportedCryptoExchanges = []
-			for exchangeId in difference:
-				if exchangeId not in supported.iexcExchanges:
-					newSupportedExchanges.append(exchangeId)
-				else:
-					unsupportedCryptoExchanges.append(exchangeId)
-			if len(newSupportedExchanges) != 0: print("New supported IEXC exchanges: {}".format(newSupportedExchanges))
-			if len(unsupportedCryptoExchanges) != 0: print("New deprecated IEXC exchanges: {}".format(unsupportedCryptoExchanges))
-
-			for exchangeId in supported.traditionalExchanges["IEXC"]:
-				symbols = get_url("https://cloud.iexapis.com/stable/ref-data/exchange/{}/symbols?token={}".format(self.exchanges[exchangeId].id, environ["IEXC_KEY"]))
-				if len(symbols) == 0: print("No symbols found on {}".format(exchangeId))
-				for symbol in symbols:
-					suffix = suffixMap.get(exchangeId, "")
-					tickerId = symbol["symbol"]
-					if tickerId not in self.iexcStocksIndex:
-						self.iexcStocksIndex[tickerId] = {"id": tickerId.removesuffix(suffix), "name": symbol["name"], "base": tickerId.removesuffix(suffix), "quote": symbol["currency"]}
-					self.exchanges[exchangeId].properties.symbols.append(tickerId)
-
-			forexSymbols = get_url("https://cloud.iexapis.com/stable/ref-data/fx/symbols?token={}".format(environ["IEXC_KEY"]))
-			derivedCurrencies = set()
-			for pair in forexSymbols["pairs"]:
-				derivedCurrencies.add(pair["fromCurrency"])
-				derivedCurrencies.add(pair["toCurrency"])
-				self.iexcForexIndex[pair["symbol"]] = {"id": pair["symbol"], "name": pair["symbol"], "base": pair["fromCurrency"], "quote": pair["toCurrency"], "reversed": False}
-				self.iexcForexIndex[pair["toCurrency"] + pair["fromCurrency"]] = {"id": pair["symbol"], "name": pair["toCurrency"] + pair["fromCurrency"], "base": pair["toCurrency"], "quote": pair["fromCurrency"], "reversed": True}
-			for fromCurrency in derivedCurrencies:
-				for toCurrency in derivedCurrencies:
-					symbol = fromCurrency + toCurrency
-					if fromCurrency != toCurrency and symbol not in self.iexcForexIndex:
-						self.iexcForexIndex[symbol] = {"id": symbol, "name": symbol, "base": fromCurrency, "quote": toCurrency, "reversed": False}
+class TickerIndex(object):
+	larkParser = Lark(GRAMMAR, parser='lalr')
+	reconstructor = Reconstructor(larkParser)
+
+	def __init__(self, source):
+		self.generationId = source.generationId
+		self.generationCycle = source.generationCycle
+		self.buildDuration = source.buildDuration
+
+		self.exchanges = source.exchanges
+		self.ccxtIndex = source.ccxtIndex
+		self.ccxtMarketIndex = source.ccxtMarketIndex
+		self.ccxtListingsIndex = source.ccxtListingsIndex
+		self.serumIndex = source.serumIndex
+		self.serumIndexOrder = source.serumIndexOrder
+		self.serumPrefixIndex = source.serumPrefixIndex
+		self.coinGeckoIndex = source.coinGeckoIndex
+		self.coinGeckoIndexOrder = source.coinGeckoIndexOrder
+		self.coinGeckoPrefixIndex = source.coinGeckoPrefixIndex
+		self.iexcStocksIndex = source.iexcStocksIndex
+		self.iexcForexIndex = source.iexcForexIndex
+		self.iexcExchangeIdIndex = source.iexcExchangeIdIndex
+		self.iexcIdIndex = source.iexcIdIndex
+		self.coingeckoVsCurrencies = source.coingeckoVsCurrencies
+		self.coingeckoFiatCurrencies = source.coingeckoFiatCurrencies
+		self.fiatMatcher = source.fiatMatcher
+
+		self.exchangeAliases, self.exchangeFallbackAliases = self._build_exchange_aliases()
+		self.tickerCache = OrderedDict()
+		self.listingsCache = {}
+		self.precisionTables = {}
+
+	def _build_exchange_aliases(self):
+		exchangeAliases, exchangeFallbackAliases = {}, {}
+		for bias, platforms in [("crypto", supported.cryptoExchanges), ("traditional", supported.traditionalExchanges)]:
+			exchangeAliases[bias], exchangeFallbackAliases[bias] = {}, {}
+			for platform in platforms:
+				exchangeAliases[bias][platform] = {}
+				for exchangeId in platforms[platform]:
+					if exchangeId not in self.exchanges: continue
+					exchange = dumps(self.exchanges[exchangeId].to_dict())
+					if self.exchanges[exchangeId].name is not None:
+						name = self.exchanges[exchangeId].name.split(" ")[0].lower()
+						nameNoSpaces = self.exchanges[exchangeId].name.replace(" ", "").lower()
+					else:
+						name, nameNoSpaces = exchangeId, exchangeId
 
-		except Exception:
-			print(format_exc())
+					for alias in EXCHANGE_SHORTCUTS[bias].get(exchangeId, []):
+						exchangeAliases[bias][platform].setdefault(alias, exchange)
+						exchangeFallbackAliases[bias].setdefault(alias, exchange)
+
+					aliases = set()
+					for value in [name, nameNoSpaces, exchangeId]:
+						aliases.update(value[:i] for i in range(len(value) + 1))
+						aliases.update(value[i:] for i in range(len(value) + 1))
+					for alias in aliases:
+						# Partial matches on the requested platform must cover at least a third of the exchange name
+						if len(name) * 0.33 <= len(alias): exchangeAliases[bias][platform].setdefault(alias, exchange)
+						exchangeFallbackAliases[bias].setdefault(alias, exchange)
+
+		return exchangeAliases, exchangeFallbackAliases
 
 	def find_exchange(self, raw, platform, bias):
 		if platform not in supported.cryptoExchanges and platform not in supported.traditionalExchanges: return [b"0", b""]
 		if raw in ["pro"]: return [b"0", b""]
 
-		shortcuts = {
-			"crypto": {
-				"binance": ["bin", "bi", "b"],
-				"bitmex": ["bmx", "mex", "btmx", "bx"],
-				"binanceusdm": ["binancefutures", "binancef", "fbin", "binf", "bif", "bf", "bnf"],
-				"coinbasepro": ["cbp", "coin", "base", "cb", "coinbase", "coinbasepro", "cbpro"],
-				"bitfinex2": ["bfx", "finex", "bf"],
-				"bittrex": ["btrx", "brx"],
-				"poloniex": ["po", "polo"],
-				"kraken": ["k", "kra"],
-				"gemini": ["ge", "gem"]
-			},
-			"traditional": {}
-		}
-
 		if platform in ["TradingLite", "Bookmap", "GoCharting", "LLD", "CoinGecko", "CCXT", "Serum", "Ichibot"]:
 			bias = "crypto"
-		elif platform in ["IEXC"]:
+		elif platform in ["IEXC"] or bias != "crypto":
 			bias = "traditional"
 
-		if bias == "crypto":
-			for exchangeId in supported.cryptoExchanges[platform]:
-				if exchangeId in shortcuts["crypto"] and raw in shortcuts["crypto"][exchangeId]:
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-				if exchangeId in self.exchanges and self.exchanges[exchangeId].name is not None:
-					name = self.exchanges[exchangeId].name.split(" ")[0].lower()
-					nameNoSpaces = self.exchanges[exchangeId].name.replace(" ", "").lower()
-				else:
-					name, nameNoSpaces = exchangeId, exchangeId
-
-				if len(name) * 0.33 > len(raw): continue
-
-				if name.startswith(raw) or name.endswith(raw):
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-				elif nameNoSpaces.startswith(raw) or nameNoSpaces.endswith(raw):
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-				elif exchangeId.startswith(raw) or exchangeId.endswith(raw):
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-
-			for platform in supported.cryptoExchanges:
-				for exchangeId in supported.cryptoExchanges[platform]:
-					if exchangeId in shortcuts["crypto"] and raw in shortcuts["crypto"][exchangeId]:
-						return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
-					if exchangeId in self.exchanges and self.exchanges[exchangeId].name is not None:
-						name = self.exchanges[exchangeId].name.split(" ")[0].lower()
-						nameNoSpaces = self.exchanges[exchangeId].name.replace(" ", "").lower()
-					else:
-						name, nameNoSpaces = exchangeId, exchangeId
+		exchange = self.exchangeAliases.get(bias, {}).get(platform, {}).get(raw)
+		if exchange is not None: return [b"1", exchange]
+		exchange = self.exchangeFallbackAliases.get(bias, {}).get(raw)
+		if exchange is not None: return [b"0", exchange]
 
-					if name.startswith(raw) or name.endswith(raw): return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
-					elif nameNoSpaces.startswith(raw) or nameNoSpaces.endswith(raw): return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
-					elif exchangeId.startswith(raw) or exchangeId.endswith(raw): return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
+		return [b"0", b""]
 
-		else:
-			for exchangeId in supported.traditionalExchanges[platform]:
-				if exchangeId in shortcuts["traditional"] and raw in shortcuts["traditional"][exchangeId]:
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-				if exchangeId in self.exchanges and self.exchanges[exchangeId].name is not None:
-					name = self.exchanges[exchangeId].name.split(" ")[0].lower()
-					nameNoSpaces = self.exchanges[exchangeId].name.replace(" ", "").lower()
-				else:
-					name, nameNoSpaces = exchangeId, exchangeId
-
-				if len(name) * 0.33 > len(raw): continue
-
-				if name.startswith(raw) or name.endswith(raw):
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-				elif nameNoSpaces.startswith(raw) or nameNoSpaces.endswith(raw):
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-				elif exchangeId.startswith(raw) or exchangeId.endswith(raw):
-					return [b"1", dumps(self.exchanges[exchangeId].to_dict())]
-
-			for platform in supported.traditionalExchanges:
-				for exchangeId in supported.traditionalExchanges[platform]:
-					if exchangeId in shortcuts["traditional"] and raw in shortcuts["traditional"][exchangeId]:
-						return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
-					if exchangeId in self.exchanges and self.exchanges[exchangeId].name is not None:
-						name = self.exchanges[exchangeId].name.split(" ")[0].lower()
-						nameNoSpaces = self.exchanges[exchangeId].name.replace(" ", "").lower()
-					else:
-						name, nameNoSpaces = exchangeId, exchangeId
+	def match_ticker(self, tickerId, exchangeId, platform, bias):
+		key = (tickerId, exchangeId, platform, bias)
+		if key in self.tickerCache:
+			try:
+				self.tickerCache.move_to_end(key)
+				return self.tickerCache[key]
+			except KeyError: pass
 
-					if name.startswith(raw) or name.endswith(raw): return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
-					elif nameNoSpaces.startswith(raw) or nameNoSpaces.endswith(raw): return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
-					elif exchangeId.startswith(raw) or exchangeId.endswith(raw): return [b"0", dumps(self.exchanges[exchangeId].to_dict())]
+		response = self._match_ticker(tickerId, exchangeId, platform, bias)
 
-		return [b"0", b""]
+		self.tickerCache[key] = response
+		if len(self.tickerCache) > TICKER_CACHE_SIZE:
+			try: self.tickerCache.popitem(last=False)
+			except KeyError: pass
+		return response
 
-	def match_ticker(self, tickerId, exchangeId, platform, bias):
+	def _match_ticker(self, tickerId, exchangeId, platform, bias):
 		if platform in ["TradingLite", "Bookmap", "LLD", "CoinGecko", "CCXT", "Serum", "Ichibot"]: bias = "crypto"
 		elif platform in ["IEXC"]: bias = "traditional"
 
 		exchange = {} if exchangeId == "" else self.exchanges.get(exchangeId).to_dict()
-
-		larkParser = Lark(GRAMMAR, parser='lalr')
-		Ticker = larkParser.parse
+		matches = {}
 
 		def match(_tickerId):
+			if _tickerId in matches: return matches[_tickerId]
+			rawTickerId = _tickerId
 			if _tickerId.startswith("$"): _tickerId = _tickerId[1:] + "USD"
 			elif _tickerId.startswith("€"): _tickerId = _tickerId[1:] + "EUR"
 			_tickerId, _ticker = self._check_overrides(_tickerId, platform), None
@@ -509,6 +839,7 @@ class TickerParserServer(object):
 					"mcapRank": MAXSIZE,
 					"isReversed": False
 				}
+			matches[rawTickerId] = _ticker
 			return _ticker
 
 		def search(node, shouldMatch=False):
@@ -522,7 +853,7 @@ class TickerParserServer(object):
 			return node
 
 		try:
-			ticker = Ticker(tickerId)
+			ticker = self.larkParser.parse(tickerId)
 		except:
 			return [dumps({
 				"tree": [
@@ -552,6 +883,7 @@ class TickerParserServer(object):
 				"isSimple": True
 			}), b""]
 
+		reconstructionTree = deepcopy(ticker)
 		search(ticker, shouldMatch=True)
 
 		isSimple = isinstance(ticker.children[0], Token) and ticker.children[0].type == "NAME"
@@ -559,7 +891,7 @@ class TickerParserServer(object):
 		if not isSimple and platform not in ["TradingView", "Alternative.me", "CoinGecko", "CCXT", "Serum", "IEXC", "LLD"]:
 			return [b"", f"Aggregated tickers aren't available on {platform}".encode()]
 
-		reconstructedId = Reconstructor(larkParser).reconstruct(search(Ticker(tickerId)))
+		reconstructedId = self.reconstructor.reconstruct(search(reconstructionTree))
 
 		response = {
 			"tree": TickerTree().transform(ticker),
@@ -588,11 +920,12 @@ class TickerParserServer(object):
 				if tickerId in self.ccxtIndex[platform]:
 					for quote in self.ccxtIndex[platform][tickerId]:
 						symbol = "{}/{}".format(tickerId, quote)
-						if symbol in e.properties.symbols:
-							if exchange is None and platform not in ["Ichibot"] and self._is_tokenized_stock(e, symbol): continue
-							base = e.properties.markets[symbol]["base"]
-							quote = e.properties.markets[symbol]["quote"]
-							if not base in self.coingeckoFiatCurrencies and e.properties.markets[symbol].get("active"):
+						if symbol in e.properties.markets:
+							market = e.properties.markets[symbol]
+							if exchange is None and platform not in ["Ichibot"] and market.isTokenizedStock: continue
+							base = market.base
+							quote = market.quote
+							if not base in self.coingeckoFiatCurrencies and market.active:
 								marketId = Utils.generate_market_id(symbol, e)
 								return {
 									"id": marketId,
@@ -610,54 +943,48 @@ class TickerParserServer(object):
 					currentBestMatch = MAXSIZE
 					currentBestFit = MAXSIZE
 					currentResult = None
-					for symbol in e.properties.symbols:
-						base = e.properties.markets[symbol]["base"]
-						quote = e.properties.markets[symbol]["quote"]
+					marketIndex = self.ccxtMarketIndex.get(e.id, {"keys": [], "positions": [], "flags": []})
+					isReversible = platform in ["CoinGecko", "CCXT", "Serum", "IEXC"]
+					candidates = set()
+					i = bisect_left(marketIndex["keys"], tickerId)
+					while i < len(marketIndex["keys"]) and marketIndex["keys"][i].startswith(tickerId):
+						key, flags = marketIndex["keys"][i], marketIndex["flags"][i]
+						if (flags & 1 and key == tickerId) or (flags & 2 and len(key) * 0.5 <= len(tickerId)):
+							if isReversible or not flags & 4: candidates.add((marketIndex["positions"][i], flags & 4))
+						i += 1
+
+					for position, isReversed in sorted(candidates):
+						symbol = e.properties.symbols[position]
+						market = e.properties.markets[symbol]
 						marketPair = symbol.split("/")
-						marketId = Utils.generate_market_id(symbol, e)
-						mcapRank = self.coinGeckoIndex.get(base, {}).get("market_cap_rank", MAXSIZE)
-						isReversed = False
-						if e.properties.markets[symbol].get("active"):
-							if len(marketPair) == 1:
-								for _ in range(2):
-									if (tickerId == marketPair[0] or (marketId.startswith(tickerId) and len(marketId) * 0.5 <= len(tickerId))) and currentBestFit > 2:
-										currentBestFit = 2
-										currentResult = {
-											"id": marketId,
-											"name": self.coinGeckoIndex.get(base, {}).get("name", marketId),
-											"base": base,
-											"quote": quote,
-											"symbol": symbol,
-											"image": self.coinGeckoIndex.get(base, {}).get("image"),
-											"exchange": e.to_dict(),
-											"mcapRank": mcapRank,
-											"isReversed": isReversed
-										}
-									if platform not in ["CoinGecko", "CCXT", "Serum", "IEXC"]: break
-									marketPair.reverse()
-									base, quote, marketId, isReversed = quote, base, "".join(marketPair), True
-
-							elif marketPair[0] in self.ccxtIndex[platform] and marketPair[1] in self.ccxtIndex[platform][marketPair[0]]:
-								rankScore = self.ccxtIndex[platform][marketPair[0]].index(marketPair[1])
-								for _ in range(2):
-									if (tickerId == marketPair[0] + marketPair[1] or (marketId.startswith(tickerId) and len(marketId) * 0.5 <= len(tickerId))) and currentBestFit >= 1 and base not in self.coingeckoFiatCurrencies and rankScore < currentBestMatch and not self._is_tokenized_stock(e, symbol):
-										currentBestMatch = rankScore
-										currentBestFit = 1
-										currentResult = {
-											"id": marketId,
-											"name": self.coinGeckoIndex.get(base, {}).get("name", marketId),
-											"base": base,
-											"quote": quote,
-											"symbol": symbol,
-											"image": self.coinGeckoIndex.get(base, {}).get("image"),
-											"exchange": e.to_dict(),
-											"mcapRank": mcapRank,
-											"isReversed": isReversed
-										}
-										break
-									if platform not in ["CoinGecko", "CCXT", "Serum", "IEXC"]: break
-									marketPair.reverse()
-									base, quote, marketId, isReversed = quote, base, "".join(marketPair), True
+						if len(marketPair) == 1:
+							fit, rankScore = 2, None
+						elif marketPair[0] in self.ccxtIndex[platform] and marketPair[1] in self.ccxtIndex[platform][marketPair[0]]:
+							fit, rankScore = 1, self.ccxtIndex[platform][marketPair[0]].index(marketPair[1])
+						else:
+							continue
+						if isReversed: base, quote, marketId, isReversed = market.quote, market.base, "".join(reversed(marketPair)), True
+						else: base, quote, marketId, isReversed = market.base, market.quote, Utils.generate_market_id(symbol, e), False
+
+						if fit == 2:
+							if currentBestFit <= 2: continue
+						elif currentBestFit < 1 or base in self.coingeckoFiatCurrencies or rankScore >= currentBestMatch or market.isTokenizedStock:
+							continue
+						else:
+							currentBestMatch = rankScore
+						currentBestFit = fit
+						mcapRank = self.coinGeckoIndex.get(market.base, {}).get("market_cap_rank", MAXSIZE)
+						currentResult = {
+							"id": marketId,
+							"name": self.coinGeckoIndex.get(base, {}).get("name", marketId),
+							"base": base,
+							"quote": quote,
+							"symbol": symbol,
+							"image": self.coinGeckoIndex.get(base, {}).get("image"),
+							"exchange": e.to_dict(),
+							"mcapRank": mcapRank,
+							"isReversed": isReversed
+						}
 
 					if currentResult is not None: return currentResult
 
@@ -686,24 +1013,24 @@ class TickerParserServer(object):
 			}
 
 		else:
-			for base in self.coinGeckoIndex:
-				if tickerId.startswith(base) and base + rank in self.coinGeckoIndex:
-					for quote in self.coingeckoVsCurrencies:
-						if _tickerId == "{}{}".format(base, quote):
-							return {
-								"id": _tickerId,
-								"name": self.coinGeckoIndex[base + rank]["name"],
-								"base": base + rank,
-								"quote": quote,
-								"symbol": self.coinGeckoIndex[base + rank]["id"],
-								"image": self.coinGeckoIndex[base + rank].get("image"),
-								"exchange": {},
-								"mcapRank": self.coinGeckoIndex[base + rank]["market_cap_rank"],
-								"isReversed": False
-							}
-
-			for base in self.coinGeckoIndex:
-				if base.startswith(_tickerId) and base + rank in self.coinGeckoIndex:
+			indexOrder = self.coinGeckoIndexOrder
+			prefixes = [tickerId[:i] for i in range(len(tickerId) + 1) if tickerId[:i] in indexOrder]
+			for base in sorted(prefixes, key=indexOrder.get):
+				if _tickerId.startswith(base) and _tickerId[len(base):] in self.coingeckoVsCurrencies and base + rank in self.coinGeckoIndex:
+					return {
+						"id": _tickerId,
+						"name": self.coinGeckoIndex[base + rank]["name"],
+						"base": base + rank,
+						"quote": _tickerId[len(base):],
+						"symbol": self.coinGeckoIndex[base + rank]["id"],
+						"image": self.coinGeckoIndex[base + rank].get("image"),
+						"exchange": {},
+						"mcapRank": self.coinGeckoIndex[base + rank]["market_cap_rank"],
+						"isReversed": False
+					}
+
+			for base in self.coinGeckoPrefixIndex.get(_tickerId, []):
+				if base + rank in self.coinGeckoIndex:
 					return {
 						"id": "{}USD".format(base),
 						"name": self.coinGeckoIndex[base + rank]["name"],
@@ -716,28 +1043,27 @@ class TickerParserServer(object):
 						"isReversed": False
 					}
 
-			for base in self.coinGeckoIndex:
-				if _tickerId.endswith(base):
-					for quote in self.coingeckoVsCurrencies:
-						if _tickerId == "{}{}".format(quote, base) and quote + rank in self.coinGeckoIndex:
-							return {
-								"id": _tickerId,
-								"name": self.coinGeckoIndex[quote + rank]["name"],
-								"base": quote,
-								"quote": base + rank,
-								"symbol": self.coinGeckoIndex[quote + rank]["id"],
-								"image": self.coinGeckoIndex[quote + rank].get("image"),
-								"exchange": {},
-								"mcapRank": self.coinGeckoIndex[quote + rank]["market_cap_rank"],
-								"isReversed": True
-							}
+			suffixes = [_tickerId[i:] for i in range(len(_tickerId) + 1) if _tickerId[i:] in indexOrder]
+			for base in sorted(suffixes, key=indexOrder.get):
+				quote = _tickerId[:len(_tickerId) - len(base)]
+				if quote in self.coingeckoVsCurrencies and quote + rank in self.coinGeckoIndex:
+					return {
+						"id": _tickerId,
+						"name": self.coinGeckoIndex[quote + rank]["name"],
+						"base": quote,
+						"quote": base + rank,
+						"symbol": self.coinGeckoIndex[quote + rank]["id"],
+						"image": self.coinGeckoIndex[quote + rank].get("image"),
+						"exchange": {},
+						"mcapRank": self.coinGeckoIndex[quote + rank]["market_cap_rank"],
+						"isReversed": True
+					}
 
 		return None
 
 	def find_iexc_market(self, tickerId, exchangeId, platform):
 		exchange = None if exchangeId == "" else self.exchanges[exchangeId]
 		if platform not in supported.traditionalExchanges or (exchange is not None and exchange.type != "traditional"): return None
-		exchanges = [self.exchanges[e] for e in supported.traditionalExchanges[platform] if self.exchanges[e].type == "traditional"] if exchange is None else [exchange]
 
 		if tickerId in self.iexcForexIndex and exchange is None:
 			matchedTicker = self.iexcForexIndex[tickerId]
@@ -752,32 +1078,24 @@ class TickerParserServer(object):
 			}
 
 		else:
-			for e in exchanges:
-				if tickerId in e.properties.symbols:
-					matchedTicker = self.iexcStocksIndex[tickerId]
-					return {
-						"id": matchedTicker["id"],
-						"name": matchedTicker["name"],
-						"base": matchedTicker["base"],
-						"quote": matchedTicker["quote"],
-						"symbol": tickerId,
-						"exchange": e.to_dict(),
-						"isReversed": False
-					}
+			if exchange is None:
+				exchangeId, symbol = self.iexcIdIndex.get(tickerId, (None, None))
+			elif tickerId in exchange.properties.symbols:
+				symbol = tickerId
+			else:
+				symbol = self.iexcExchangeIdIndex.get(exchangeId, {}).get(tickerId)
 
-				else:
-					symbols = {self.iexcStocksIndex[s]["id"]: (s, self.iexcStocksIndex[s]) for s in e.properties.symbols if s in self.iexcStocksIndex}
-					if tickerId in symbols:
-						symbol, matchedTicker = symbols[tickerId]
-						return {
-							"id": matchedTicker["id"],
-							"name": matchedTicker["name"],
-							"base": matchedTicker["base"],
-							"quote": matchedTicker["quote"],
-							"symbol": symbol,
-							"exchange": e.to_dict(),
-							"isReversed": False
-						}
+			if symbol is not None:
+				matchedTicker = self.iexcStocksIndex[symbol]
+				return {
+					"id": matchedTicker["id"],
+					"name": matchedTicker["name"],
+					"base": matchedTicker["base"],
+					"quote": matchedTicker["quote"],
+					"symbol": symbol,
+					"exchange": self.exchanges[exchangeId].to_dict(),
+					"isReversed": False
+				}
 
 		return None
 
@@ -798,75 +1116,78 @@ class TickerParserServer(object):
 				}
 		
 		else:
-			for base in self.serumIndex:
-				if tickerId.startswith(base):
-					for market in self.serumIndex[base]:
-						if tickerId == "{}{}".format(base, market["quote"]):
-							mcapRank = self.coinGeckoIndex[base]["market_cap_rank"] if base in self.coinGeckoIndex else None
-							return {
-								"id": market["id"],
-								"name": self.coinGeckoIndex.get(tickerId, {}).get("name", tickerId + market["quote"]),
-								"base": tickerId,
-								"quote": market["quote"],
-								"symbol": market["program"],
-								"image": market.get("image"),
-								"mcapRank": mcapRank,
-								"isReversed": False
-							}
-
-			for base in self.serumIndex:
-				if base.startswith(tickerId):
-					market = self.serumIndex[base][0]
-					mcapRank = self.coinGeckoIndex[base]["market_cap_rank"] if base in self.coinGeckoIndex else None
-					return {
-						"id": market["id"],
-						"name": self.coinGeckoIndex.get(tickerId, {}).get("name", tickerId + market["quote"]),
-						"base": tickerId,
-						"quote": market["quote"],
-						"symbol": market["program"],
-						"image": market.get("image"),
-						"exchange": {},
-						"mcapRank": mcapRank,
-						"isReversed": False
-					}
+			indexOrder = self.serumIndexOrder
+			prefixes = [tickerId[:i] for i in range(len(tickerId) + 1) if tickerId[:i] in indexOrder]
+			for base in sorted(prefixes, key=indexOrder.get):
+				for market in self.serumIndex[base]:
+					if tickerId == "{}{}".format(base, market["quote"]):
+						mcapRank = self.coinGeckoIndex[base]["market_cap_rank"] if base in self.coinGeckoIndex else None
+						return {
+							"id": market["id"],
+							"name": self.coinGeckoIndex.get(tickerId, {}).get("name", tickerId + market["quote"]),
+							"base": tickerId,
+							"quote": market["quote"],
+							"symbol": market["program"],
+							"image": market.get("image"),
+							"mcapRank": mcapRank,
+							"isReversed": False
+						}
+
+			matchingBases = self.serumPrefixIndex.get(tickerId)
+			if matchingBases:
+				base = matchingBases[0]
+				market = self.serumIndex[base][0]
+				mcapRank = self.coinGeckoIndex[base]["market_cap_rank"] if base in self.coinGeckoIndex else None
+				return {
+					"id": market["id"],
+					"name": self.coinGeckoIndex.get(tickerId, {}).get("name", tickerId + market["quote"]),
+					"base": tickerId,
+					"quote": market["quote"],
+					"symbol": market["program"],
+					"image": market.get("image"),
+					"exchange": {},
+					"mcapRank": mcapRank,
+					"isReversed": False
+				}
 
 		return None
 
 	def check_if_fiat(self, tickerId):
-		for fiat in self.coingeckoFiatCurrencies:
-			if fiat.upper() in tickerId: return [b"1", fiat.encode()]
+		fiat = self.fiatMatcher.find(tickerId)
+		if fiat is not None: return [b"1", fiat.encode()]
 		return [b"0", b""]
 
 	def get_listings(self, tickerBase, tickerQuote):
-		listings = {tickerQuote: []}
-		total = 0
-		for id in supported.cryptoExchanges["CCXT"]:
-			if self.exchanges[id].properties is not None and self.exchanges[id].properties.symbols is not None:
-				for symbol in self.exchanges[id].properties.symbols:
-					base = self.exchanges[id].properties.markets[symbol]["base"]
-					quote = self.exchanges[id].properties.markets[symbol]["quote"]
-					if tickerBase == base:
-						if quote not in listings: listings[quote] = []
-						if self.exchanges[id].name not in listings[quote]:
-							listings[quote].append(self.exchanges[id].name)
-							total += 1
-
-		response = [[tickerQuote, listings.pop(tickerQuote)]]
-		if tickerBase in self.ccxtIndex["CCXT"]:
-			for quote in self.ccxtIndex["CCXT"][tickerBase]:
-				if quote in listings:
-					response.append([quote, listings.pop(quote)])
-
-		return [dumps(response), str(total).encode()]
+		if (tickerBase, tickerQuote) in self.listingsCache: return self.listingsCache[(tickerBase, tickerQuote)]
+
+		quotes, rankedQuotes, total = self.ccxtListingsIndex.get(tickerBase, ({}, [], 0))
+		response = [[tickerQuote, quotes.get(tickerQuote, [])]]
+		for quote in rankedQuotes:
+			if quote != tickerQuote:
+				response.append([quote, quotes[quote]])
+
+		response = [dumps(response), str(total).encode()]
+		if tickerQuote in quotes: self.listingsCache[(tickerBase, tickerQuote)] = response
+		return response
+
+	def get_precision_table(self, exchangeId):
+		if exchangeId in self.precisionTables: return self.precisionTables[exchangeId]
+		exchange = self.exchanges[exchangeId].properties if exchangeId in self.exchanges else None
+		# Unknown exchanges and exchanges without loaded markets get an empty table, clients cache it like any other
+		if exchange is None or exchange.markets is None: table = {"precisionMode": None, "markets": {}}
+		else: table = {"precisionMode": exchange.precisionMode, "markets": {symbol: [market.pricePrecision, market.amountPrecision] for symbol, market in exchange.markets.items()}}
+		response = [dumps(table)]
+		self.precisionTables[exchangeId] = response
+		return response
 
 	def format_price(self, exchangeId, symbol, price):
 		exchange = self.exchanges[exchangeId].properties
-		precision = exchange.markets.get(symbol, {}).get("precision", {}).get("price", 8)
+		precision = exchange.markets[symbol].pricePrecision if symbol in exchange.markets else 8
 		return [dtp.decimal_to_precision(price, rounding_mode=dtp.ROUND, precision=precision, counting_mode=exchange.precisionMode, padding_mode=dtp.PAD_WITH_ZERO).encode()]
 
 	def format_amount(self, exchangeId, symbol, amount):
 		exchange = self.exchanges[exchangeId].properties
-		precision = exchange.markets.get(symbol, {}).get("precision", {}).get("amount", 8)
+		precision = exchange.markets[symbol].amountPrecision if symbol in exchange.markets else 8
 		return [dtp.decimal_to_precision(amount, rounding_mode=dtp.TRUNCATE, precision=precision, counting_mode=exchange.precisionMode, padding_mode=dtp.NO_PADDING).encode()]
 
 	def check_if_tradable(self, tickerId):
@@ -881,12 +1202,6 @@ class TickerParserServer(object):
 				return tickerId
 		return tickerId
 
-	def _is_tokenized_stock(self, e, symbol):
-		ftxTokenizedStock = e.id == "ftx" and e.properties.markets[symbol]["info"].get("tokenizedEquity", False)
-		bittrexTokenizedStock = e.id == "bittrex" and "TOKENIZED_SECURITY" in e.properties.markets[symbol]["info"].get("tags", [])
-		return ftxTokenizedStock or bittrexTokenizedStock
-
-
 class TickerTree(Transformer):
 	def add(self, tree): return self.genenrate_dict(tree, "add")
 	def sub(self, tree): return self.genenrate_dict(tree, "sub")
@@ -910,4 +1225,13 @@ if __name__ == "__main__":
 	environ["PRODUCTION_MODE"] = environ["PRODUCTION_MODE"] if "PRODUCTION_MODE" in environ and environ["PRODUCTION_MODE"] else ""
 	print("[Startup]: Ticker Parser Server is in startup, running in {} mode.".format("production" if environ["PRODUCTION_MODE"] else "development"))
 	tickerParser = TickerParserServer()
-	tickerParser.run()
\ No newline at end of file
+	print("[Startup]: Ticker Parser is ready")
+
+	processingThreads = []
+	for i in range(4):
+		p = Thread(target=tickerParser.run)
+		p.start()
+		processingThreads.append(p)
+
+	print("[Startup]: Ticker Parser is online")
+	tickerParser.queue()
\ No newline at end of file